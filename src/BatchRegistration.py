@@ -0,0 +1,148 @@
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Sequence, Tuple
+import numpy as np
+from ICP import ICP
+from KDTree import KDTree
+from PointCloud import PointCloud
+from RegistrationResult import RegistrationResult
+
+_worker_trees: Dict[str, Tuple[KDTree, PointCloud]] = {}
+
+
+def _register(descriptor: dict, source: np.ndarray, options: dict, live: Sequence[str]) -> RegistrationResult:
+    """
+    Совмещение одной пары в процессе-исполнителе.
+    Дерево target подключается из общей памяти один раз на процесс, деревья освобожденных блоков забываются.
+
+    Args:
+        descriptor (dict): описание дерева target, возвращенное KDTree.share.
+        source (np.ndarray): точки source.
+        options (dict): параметры ICP.
+        live (Sequence[str]): имена блоков общей памяти, которые еще используются.
+
+    Returns:
+        RegistrationResult: результат совмещения.
+    """
+    for name in set(_worker_trees) - set(live):
+        del _worker_trees[name]
+    if descriptor['name'] not in _worker_trees:
+        tree = KDTree.attach(descriptor)
+        _worker_trees[descriptor['name']] = (tree, PointCloud(tree.points))
+    tree, target = _worker_trees[descriptor['name']]
+    return ICP(PointCloud(source), target, spatial_index=tree, **options).icp_algorithm()
+
+
+class BatchRegistration:
+    """
+    Пакетное совмещение многих пар сканов.
+    Дерево каждого target строится один раз перед первой парой с этим target, переиспользуется всеми такими парами
+    и освобождается после последней из них. Пары выполняются параллельно в пуле процессов, в работе одновременно
+    не больше двух пар на процесс, результаты возвращаются по мере готовности.
+    """
+
+    def __init__(self, workers: int = 1, **icp_options):
+        """
+        Инициализировать пакетное совмещение.
+
+        Args:
+            workers (int): число процессов. При workers == 1 пары выполняются в текущем процессе.
+            icp_options: параметры ICP для всех пар (penalty_bound, max_iter, method, relative_tol и т.д.).
+        """
+        if workers < 1:
+            raise ValueError(f"Workers count {workers} have to be >= 1")
+        self._workers = workers
+        self._icp_options = icp_options
+
+    def register_pairs(self, clouds: Sequence[PointCloud],
+                       pairs: Sequence[Tuple[int, int]]) -> Iterator[Tuple[int, int, RegistrationResult]]:
+        """
+        Совместить пары сканов.
+
+        Args:
+            clouds (Sequence[PointCloud]): сканы.
+            pairs (Sequence[Tuple[int, int]]): пары (индекс source, индекс target).
+
+        Returns:
+            Iterator[Tuple[int, int, RegistrationResult]]: (индекс source, индекс target, результат)
+                в порядке завершения.
+        """
+        remaining = Counter(target_index for _, target_index in pairs)
+        if self._workers == 1:
+            trees = {}
+            for source_index, target_index in pairs:
+                if target_index not in trees:
+                    trees[target_index] = KDTree(PointCloud)
+                    trees[target_index].build(clouds[target_index])
+                icp = ICP(clouds[source_index], clouds[target_index], spatial_index=trees[target_index],
+                          **self._icp_options)
+                result = icp.icp_algorithm()
+                remaining[target_index] -= 1
+                if not remaining[target_index]:
+                    del trees[target_index]
+                yield source_index, target_index, result
+            return
+
+        shared = {}
+        pending = {}
+        queue = iter(pairs)
+        executor = ProcessPoolExecutor(max_workers=self._workers)
+        try:
+            while True:
+                for source_index, target_index in queue:
+                    if target_index not in shared:
+                        tree = KDTree(PointCloud)
+                        tree.build(clouds[target_index])
+                        shared[target_index] = tree.share()
+                    live = [descriptor['name'] for _, descriptor in shared.values()]
+                    future = executor.submit(_register, shared[target_index][1], clouds[source_index].points,
+                                             self._icp_options, live)
+                    pending[future] = (source_index, target_index)
+                    if len(pending) >= 2 * self._workers:
+                        break
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    source_index, target_index = pending.pop(future)
+                    remaining[target_index] -= 1
+                    if not remaining[target_index]:
+                        shared_memory, _ = shared.pop(target_index)
+                        shared_memory.close()
+                        shared_memory.unlink()
+                    yield source_index, target_index, future.result()
+        finally:
+            executor.shutdown(cancel_futures=True)
+            for shared_memory, _ in shared.values():
+                shared_memory.close()
+                shared_memory.unlink()
+
+    def register_chain(self, clouds: Sequence[PointCloud]) -> Iterator[Tuple[int, int, RegistrationResult]]:
+        """
+        Совместить последовательность сканов: каждый скан i + 1 со сканом i.
+
+        Args:
+            clouds (Sequence[PointCloud]): сканы в порядке съемки.
+
+        Returns:
+            Iterator[Tuple[int, int, RegistrationResult]]: (i + 1, i, результат) в порядке завершения.
+        """
+        return self.register_pairs(clouds, [(i + 1, i) for i in range(len(clouds) - 1)])
+
+    @staticmethod
+    def chain_poses(results: Sequence[Tuple[int, int, RegistrationResult]]) -> List[np.ndarray]:
+        """
+        Перевести попарные преобразования цепочки в преобразования каждого скана в систему координат первого.
+
+        Args:
+            results (Sequence[Tuple[int, int, RegistrationResult]]): результаты register_chain в любом порядке.
+
+        Returns:
+            List[np.ndarray]: матрицы 4x4, i-я переводит скан i в систему координат скана 0.
+        """
+        transforms = {source_index: result.transformation for source_index, _, result in results}
+        poses = [np.eye(4)]
+        for i in range(1, len(transforms) + 1):
+            poses.append(poses[-1] @ transforms[i])
+        return poses
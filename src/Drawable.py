@@ -1,10 +1,14 @@
 from abc import ABCMeta
-from mpl_toolkits.mplot3d import Axes3D
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from mpl_toolkits.mplot3d import Axes3D
 
 
 class Drawable(metaclass=ABCMeta):
+    __slots__ = ()
 
-    def draw(self, ax: Axes3D, color: str):
+    def draw(self, ax: 'Axes3D', color: str):
         """
         Отрисовать объект в matplotlib.
 
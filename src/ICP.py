@@ -1,9 +1,14 @@
-from typing import Optional
+import time
+from typing import TYPE_CHECKING, Callable, Iterator, Optional, Sequence, Tuple
 import numpy as np
-from matplotlib import pyplot as plt
-from mpl_toolkits.mplot3d import Axes3D
 from KDTree import KDTree
+from Metrics import ICPMetrics
 from PointCloud import PointCloud
+from RegistrationResult import RegistrationResult, StopReason
+from SpatialIndex import SpatialIndex
+
+if TYPE_CHECKING:
+    from ParallelSearch import ParallelSearch
 
 
 class ICP:
@@ -11,7 +16,15 @@ class ICP:
     Реализует алгоритм Iterative Closest Point.
     """
 
-    def __init__(self, source: PointCloud, target: PointCloud, penalty_bound: float = 1e-18, max_iter: int = 20):
+    METHODS = ('point_to_point', 'point_to_plane')
+
+    def __init__(self, source: PointCloud, target: PointCloud, penalty_bound: float = 1e-18, max_iter: int = 20,
+                 workers: int = 1, init_transform: Optional[np.ndarray] = None, method: str = 'point_to_point',
+                 normals_k: int = 10, max_distance: float = np.inf, trim_ratio: float = 1.0,
+                 max_normal_angle: Optional[float] = None, warm_start: bool = True, rotation_tol: float = 0.0,
+                 translation_tol: float = 0.0, relative_tol: float = 0.0, time_budget: Optional[float] = None,
+                 spatial_index: Optional[SpatialIndex] = None, metrics: Optional[ICPMetrics] = None,
+                 eps: float = 0.0, max_leaves: Optional[int] = None):
         """
         Инициализация класса, реализующего алгоритм ICP.
         Смещает облако точек source к облаку точек target.
@@ -21,36 +34,198 @@ class ICP:
             target (PointCloud): облако точек, к которому смещаем.
             penalty_bound (float): значение штрафное функции, при котором оканчиваем алгоритм.
             max_iter (int): максимальное число итераций алгоритма.
+            workers (int): число процессов для поиска ближайших соседей. При workers > 1 дерево target
+                размещается в общей памяти на время запуска алгоритма, после icp_step() пул процессов
+                останавливается методом close() или при удалении объекта.
+                Поддерживается только для KDTree.
+            init_transform (Optional[np.ndarray]): начальное преобразование source 4x4, если None, то единичное.
+            method (str): минимизируемая ошибка: 'point_to_point' или 'point_to_plane'. Для 'point_to_plane'
+                нормали target оцениваются один раз и сохраняются в target.normals.
+            normals_k (int): число соседей для оценки нормалей target.
+            max_distance (float): пары дальше этого расстояния отбрасываются еще при поиске в дереве.
+            trim_ratio (float): доля пар с наименьшими расстояниями, которые используются на шаге (trimmed ICP).
+            max_normal_angle (Optional[float]): максимальный угол между нормалями source и target в паре (в радианах),
+                если None, то нормали не сравниваются. Нормали source оцениваются один раз.
+            warm_start (bool): начинать поиск соседа каждой точки с расстояния до ее соседа на прошлой итерации.
+            rotation_tol (float): угол поворота шага (в радианах), ниже которого вместе с translation_tol
+                алгоритм считается сошедшимся. 0 - не проверять.
+            translation_tol (float): длина сдвига шага, ниже которой вместе с rotation_tol
+                алгоритм считается сошедшимся. 0 - не проверять.
+            relative_tol (float): относительное изменение среднеквадратичного отклонения между итерациями,
+                ниже которого алгоритм считается сошедшимся. 0 - не проверять.
+            time_budget (Optional[float]): ограничение времени работы алгоритма в секундах, если None, то нет.
+            spatial_index (Optional[SpatialIndex]): уже построенная по target структура поиска соседей,
+                например KDTree или VoxelGrid. Если None, то строится KDTree.
+            metrics (Optional[ICPMetrics]): сбор времени фаз и счетчиков обхода дерева по итерациям,
+                если None, то метрики не собираются.
+            eps (float): допустимая относительная ошибка приближенного поиска соседей на первых итерациях.
+                Когда относительное уменьшение среднеквадратичного отклонения за итерацию становится меньше
+                текущего eps, eps уменьшается вдвое. Перед остановкой по penalty_bound, relative_tol
+                или rotation_tol и translation_tol поиск переключается на точный, и критерий проверяется заново.
+                0 - всегда точный поиск.
+            max_leaves (Optional[int]): максимальное число просмотренных листьев дерева на запрос, ограничение
+                ослабляется и снимается вместе с eps. Поддерживается только для KDTree.
+        """
+
+        """
+        Исходное облако source не изменяется: алгоритм накапливает одно жесткое преобразование
+        _transform и применяет его к точкам source одним матричным умножением.
         """
         self._source = source
         self._target = target
         self._penalty_bound = penalty_bound
         self._max_iter = max_iter
 
-        self._kd_tree = KDTree(PointCloud)
-        self._kd_tree.build(target)
+        if spatial_index is None:
+            spatial_index = KDTree(PointCloud)
+            spatial_index.build(target)
+        elif len(spatial_index.points) != len(target):
+            raise ValueError("Spatial index have to be built on target")
+        self._index = spatial_index
+
+        if workers < 1:
+            raise ValueError(f"Workers count {workers} have to be >= 1")
+        if workers > 1 and not isinstance(spatial_index, KDTree):
+            raise ValueError("Parallel search is supported only for KDTree")
+        if eps < 0:
+            raise ValueError(f"eps = {eps} have to be >= 0")
+        if max_leaves is not None and (max_leaves < 1 or not isinstance(spatial_index, KDTree)):
+            raise ValueError(f"Max leaves {max_leaves} have to be >= 1 and is supported only for KDTree")
+        self._eps = eps
+        self._max_leaves = max_leaves
+        self._current_eps = eps
+        self._current_max_leaves = max_leaves
+        self._workers = workers
+        self._parallel_search: Optional['ParallelSearch'] = None
+        self._penalty: Optional[float] = None
+        self._transform = np.eye(4) if init_transform is None else np.array(init_transform, dtype=np.float64)
+        self._iterations = 0
+
+        if method not in self.METHODS:
+            raise ValueError(f"Unknown method {method}, expected one of {self.METHODS}")
+        self._method = method
+        if method == 'point_to_plane' and (target.normals is None or len(target.normals) != len(target)):
+            target.estimate_normals(self._index, normals_k)
+        self._normals_k = normals_k
+
+        if max_distance <= 0:
+            raise ValueError(f"Max distance {max_distance} have to be > 0")
+        if not 0 < trim_ratio <= 1:
+            raise ValueError(f"Trim ratio {trim_ratio} have to be in (0, 1]")
+        self._max_distance = max_distance
+        self._trim_ratio = trim_ratio
+        self._max_normal_angle = max_normal_angle
+        self._warm_start = warm_start
+        self._previous_indices: Optional[np.ndarray] = None
+
+        self._rotation_tol = rotation_tol
+        self._translation_tol = translation_tol
+        self._relative_tol = relative_tol
+        self._time_budget = time_budget
+        self._stop_reason: Optional[StopReason] = None
+        self._elapsed = 0.0
+        self._metrics = metrics
+        if max_normal_angle is not None:
+            if target.normals is None or len(target.normals) != len(target):
+                target.estimate_normals(self._index, normals_k)
+            if source.normals is None or len(source.normals) != len(source):
+                source.estimate_normals(k=normals_k)
 
     @property
-    def source(self):
-        return self._source
+    def source(self) -> PointCloud:
+        """
+        Облако source после накопленного преобразования. Вычисляется при обращении.
+
+        Returns:
+            PointCloud: смещенное облако точек.
+        """
+        return PointCloud(self._transformed_source())
+
+    @property
+    def transformation(self) -> np.ndarray:
+        """
+        Накопленное преобразование source в однородных координатах.
+
+        Returns:
+            np.ndarray: матрица 4x4.
+        """
+        return self._transform
+
+    @property
+    def result(self) -> RegistrationResult:
+        return RegistrationResult(self._transform, self._penalty, self._iterations, self._stop_reason, self._elapsed)
+
+    def _transformed_source(self) -> np.ndarray:
+        """
+        Применить накопленное преобразование к исходным точкам source.
+
+        Returns:
+            np.ndarray: массив точек размера (N, 3).
+        """
+        return self._source.points @ self._transform[:3, :3].T + self._transform[:3, 3]
 
     @property
     def target(self):
         return self._target
 
+    def _query(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти ближайших соседей в target для набора точек в пределах max_distance.
+        При warm_start соседи прошлого запроса передаются в дерево как начальные кандидаты.
+
+        Args:
+            points (np.ndarray): массив точек размера (M, 3).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (расстояния, индексы точек target).
+            Для точек без соседа - (inf, len(target)).
+        """
+        hint = self._previous_indices if self._warm_start else None
+        stats = None if self._metrics is None else dict.fromkeys(self._index.STATS_KEYS, 0)
+        options = {'eps': self._current_eps}
+        if self._current_max_leaves is not None:
+            options['max_leaves'] = self._current_max_leaves
+        if self._workers == 1:
+            dist, indices = self._index.query(points, max_distance=self._max_distance, hint=hint, stats=stats,
+                                              **options)
+        else:
+            if self._parallel_search is None:
+                # Пул процессов нужен только при workers > 1, поэтому модуль загружается при первом запросе
+                from ParallelSearch import ParallelSearch
+
+                self._parallel_search = ParallelSearch(self._index, self._workers)
+            dist, indices = self._parallel_search.query(points, max_distance=self._max_distance, hint=hint,
+                                                        stats=stats, **options)
+        if stats is not None:
+            for name, value in stats.items():
+                self._metrics.count(name, value)
+        self._previous_indices = indices
+        return dist, indices
+
+    def close(self):
+        """
+        Остановить пул процессов поиска ближайших соседей, если он был запущен.
+        """
+        if self._parallel_search is not None:
+            self._parallel_search.close()
+            self._parallel_search = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
     @property
     def calculate_penalty(self) -> float:
         """
         Штрафная функция.
 
         Returns:
-            float: квадратичное отклонение.
+            float: квадратичное отклонение по принятым парам, inf если пар не осталось.
         """
-        penalty = 0
-        for p in self._source:
-            dist, _ = self._kd_tree.find_closest(p)
-            penalty += dist ** 2
-        return penalty / self._source.length
+        dist, _, _ = self._correspondences(self._transformed_source())
+        return np.mean(np.square(dist)) if len(dist) else np.inf
 
     @staticmethod
     def find_rotation_matrix(source: PointCloud, target: PointCloud) -> np.array:
@@ -81,50 +256,371 @@ class ICP:
         u, _, vt = np.linalg.svd(s)
         return np.matmul(vt.T, u.T)
 
+    def _correspondences(self, points: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Найти пары точек source и target и отбросить неподходящие: дальше max_distance,
+        с несовместимыми нормалями и не попавшие в долю trim_ratio лучших.
+
+        Args:
+            points (np.ndarray): смещенные точки source.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray, np.ndarray] - (расстояния, индексы точек source, индексы точек target).
+            Если отброшены все пары, то массивы пустые.
+        """
+        with ICPMetrics.optional_phase(self._metrics, 'nn_search'):
+            dist, indices = self._query(points)
+
+        with ICPMetrics.optional_phase(self._metrics, 'rejection'):
+            mask = np.isfinite(dist)
+            if self._max_normal_angle is not None:
+                source_normals = self._source.normals @ self._transform[:3, :3].T
+                target_normals = self._target.normals[np.where(mask, indices, 0)]
+                cos = np.abs(np.einsum('ij,ij->i', source_normals, target_normals))
+                mask &= cos >= np.cos(self._max_normal_angle)
+
+            source_indices = np.flatnonzero(mask)
+            if self._trim_ratio < 1 and len(source_indices):
+                count = max(1, int(np.ceil(self._trim_ratio * len(source_indices))))
+                if count < len(source_indices):
+                    source_indices = source_indices[np.argpartition(dist[source_indices], count - 1)[:count]]
+        if self._metrics is not None:
+            self._metrics.count('correspondences', len(source_indices))
+        return dist[source_indices], source_indices, indices[source_indices]
+
+    def _match(self) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти пары точек source и target и запомнить значение штрафной функции для них.
+        Если пар не осталось, то значение штрафной функции не меняется.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (смещенные точки source из принятых пар, индексы их соседей в target).
+        """
+        with ICPMetrics.optional_phase(self._metrics, 'transform_apply'):
+            points = self._transformed_source()
+        dist, source_indices, indices = self._correspondences(points)
+        if len(dist):
+            self._penalty = np.mean(np.square(dist))
+        return points[source_indices], indices
+
+    def _align(self, points: np.ndarray, indices: np.ndarray) -> np.ndarray:
+        """
+        Добавить к накопленному преобразованию шаг, совмещающий точки с найденными соседями.
+
+        Args:
+            points (np.ndarray): смещенные точки source.
+            indices (np.ndarray): индексы соседей в target для точек source.
+
+        Returns:
+            np.ndarray: преобразование шага 4x4.
+        """
+        if self._method == 'point_to_plane':
+            with ICPMetrics.optional_phase(self._metrics, 'solve'):
+                rotation_matrix, translation = self.find_plane_transform(points, self._index.points[indices],
+                                                                         self._target.normals[indices])
+        else:
+            rotation_matrix, translation = self.find_rigid_transform(points, self._index.points[indices],
+                                                                     self._metrics)
+        with ICPMetrics.optional_phase(self._metrics, 'transform_update'):
+            step = np.eye(4)
+            step[:3, :3], step[:3, 3] = rotation_matrix, translation
+            self._transform = step @ self._transform
+        self._iterations += 1
+        return step
+
+    @property
+    def penalty(self) -> Optional[float]:
+        """
+        Значение штрафной функции, посчитанное при последнем поиске соседей, без повторного поиска.
+
+        Returns:
+            Optional[float]: квадратичное отклонение до последнего шага, None если шагов не было
+                или ни в одном поиске не осталось пар.
+        """
+        return self._penalty
+
+    @property
+    def eps(self) -> float:
+        """
+        Текущая допустимая относительная ошибка поиска соседей.
+
+        Returns:
+            float: eps, 0 - точный поиск.
+        """
+        return self._current_eps
+
+    @property
+    def _approximate(self) -> bool:
+        return self._current_eps > 0 or self._current_max_leaves is not None
+
+    def _tighten(self, improvement: float):
+        """
+        Уменьшить ошибку приближенного поиска, если итерации перестали заметно уменьшать отклонение.
+
+        Args:
+            improvement (float): относительное уменьшение среднеквадратичного отклонения за итерацию.
+        """
+        if self._approximate and improvement < self._current_eps:
+            self._current_eps /= 2
+            if self._current_max_leaves is not None:
+                self._current_max_leaves *= 2
+
+    def _converged(self, previous_rmse: Optional[float]) -> Optional[StopReason]:
+        """
+        Проверить критерии остановки по значению штрафной функции.
+
+        Args:
+            previous_rmse (Optional[float]): среднеквадратичное отклонение на прошлой итерации.
+
+        Returns:
+            Optional[StopReason]: причина остановки или None.
+        """
+        if self._penalty < self._penalty_bound:
+            return StopReason.PENALTY_BOUND
+        rmse = np.sqrt(self._penalty)
+        if previous_rmse is not None and abs(previous_rmse - rmse) < self._relative_tol * previous_rmse:
+            return StopReason.RELATIVE_CHANGE
+        return None
+
     def icp_step(self) -> PointCloud:
         """
-        Шаг алгоритма.
+        Шаг алгоритма. Значение штрафной функции до шага доступно через penalty.
+        Если все пары отброшены, то преобразование не меняется.
 
         Returns:
             PointCloud: смещенное облако точек.
         """
+        if self._metrics is not None:
+            self._metrics.start_iteration()
+        points, indices = self._match()
+        if len(indices):
+            self._align(points, indices)
+        if self._metrics is not None:
+            self._metrics.end_iteration()
+        return self.source
+
+    def iterate(self, max_iter: Optional[int] = None, time_budget: Optional[float] = None,
+                debug: bool = False) -> Iterator[RegistrationResult]:
+        """
+        Запуск алгоритма в виде потока итераций.
+        На каждой итерации выполняется один поиск соседей: он же дает значение штрафной функции.
+        После каждого шага возвращается текущее состояние; по окончании причина остановки
+        доступна в result.stop_reason.
+
+        Args:
+            max_iter (Optional[int]): максимальное число итераций, если None, то заданное при инициализации.
+            time_budget (Optional[float]): ограничение времени в секундах, если None, то заданное при инициализации.
+            debug (bool): дебаг.
+
+        Returns:
+            Iterator[RegistrationResult]: состояние после каждого шага.
+            При workers > 1 пул процессов останавливается, когда поток итераций завершен или закрыт.
+        """
+        max_iter = self._max_iter if max_iter is None else max_iter
+        time_budget = self._time_budget if time_budget is None else time_budget
+        start = time.perf_counter()
+        previous_rmse = None
+        self._stop_reason = StopReason.MAX_ITER
+        self._current_eps, self._current_max_leaves = self._eps, self._max_leaves
+        try:
+            for _ in range(max_iter):
+                if time_budget is not None and time.perf_counter() - start >= time_budget:
+                    self._stop_reason = StopReason.TIME_BUDGET
+                    break
+
+                if self._metrics is not None:
+                    self._metrics.start_iteration()
+                try:
+                    points, indices = self._match()
+                    if not len(indices) and self._approximate:
+                        self._current_eps, self._current_max_leaves = 0.0, None
+                        points, indices = self._match()
+                    if not len(indices):
+                        # Все пары отброшены (например, при частичном перекрытии и малом max_distance):
+                        # остается преобразование последнего шага
+                        self._stop_reason = StopReason.NO_CORRESPONDENCES
+                        break
+                    reason = self._converged(previous_rmse)
+                    if reason is not None and self._approximate:
+                        # Сходимость подтверждается на точных соседях
+                        self._current_eps, self._current_max_leaves = 0.0, None
+                        points, indices = self._match()
+                        reason = self._converged(previous_rmse)
+                    if reason is not None:
+                        self._stop_reason = reason
+                        break
+                    rmse = np.sqrt(self._penalty)
+                    if previous_rmse is not None:
+                        self._tighten((previous_rmse - rmse) / previous_rmse)
+                    previous_rmse = rmse
+                    if debug:
+                        print(self._penalty)
+
+                    # Шаг алгоритма
+                    step = self._align(points, indices)
+                finally:
+                    if self._metrics is not None:
+                        self._metrics.end_iteration()
+
+                self._elapsed = time.perf_counter() - start
+                yield self.result
+
+                if self._small_step(step):
+                    if not self._approximate:
+                        self._stop_reason = StopReason.TRANSFORM_DELTA
+                        break
+                    self._current_eps, self._current_max_leaves = 0.0, None
+        finally:
+            # Пул процессов и общая память освобождаются сразу, следующий запуск создаст их заново
+            self.close()
+
+        self._elapsed = time.perf_counter() - start
+        if debug:
+            print(self._stop_reason.value)
+
+    def _small_step(self, step: np.ndarray) -> bool:
+        """
+        Проверить, что шаг меньше rotation_tol и translation_tol. Нулевой допуск не проверяется,
+        если оба допуска нулевые, то шаг не считается малым.
+
+        Args:
+            step (np.ndarray): преобразование шага 4x4.
 
-        # Найти ближайших соседей
-        correspondence = [(*self._kd_tree.find_closest(p), p) for p in self._source]
-        neighbours = PointCloud([p[1] for p in correspondence])
+        Returns:
+            bool: шаг меньше заданных допусков.
+        """
+        if self._rotation_tol == 0 and self._translation_tol == 0:
+            return False
+        angle = np.arccos(np.clip((np.trace(step[:3, :3]) - 1) / 2, -1.0, 1.0))
+        return ((self._rotation_tol == 0 or angle < self._rotation_tol) and
+                (self._translation_tol == 0 or np.linalg.norm(step[:3, 3]) < self._translation_tol))
 
-        # Сдвиг
-        self._source += neighbours.mass_center - self._source.mass_center
+    def icp_algorithm(self, debug: bool = False, max_iter: Optional[int] = None, time_budget: Optional[float] = None,
+                      on_iteration: Optional[Callable[[RegistrationResult], None]] = None) -> RegistrationResult:
+        """
+        Запуск алгоритма до остановки.
+        Алгоритм останавливается по первому выполненному критерию, причина доступна в RegistrationResult.stop_reason.
 
-        # Поворот
-        rotation_matrix = self.find_rotation_matrix(self._source, neighbours)
-        self._source.rotate(rotation_matrix)
+        Args:
+            debug (bool): дебаг.
+            max_iter (Optional[int]): максимальное число итераций, если None, то заданное при инициализации.
+            time_budget (Optional[float]): ограничение времени в секундах, если None, то заданное при инициализации.
+            on_iteration (Optional[Callable[[RegistrationResult], None]]): вызывается с состоянием после каждого шага,
+                например RegistrationViewer.publish. Не должен блокироваться.
 
-        return self._source
+        Returns:
+            RegistrationResult: итоговое преобразование source.
+        """
+        for state in self.iterate(max_iter, time_budget, debug):
+            if on_iteration is not None:
+                on_iteration(state)
+        return self.result
 
-    def icp_algorithm(self, debug: bool = False, ax: Optional[Axes3D] = None, pause_time: float = 0.1):
+    def icp_pyramid(self, voxel_sizes: Sequence[float], max_iters: Optional[Sequence[int]] = None,
+                    debug: bool = False,
+                    on_iteration: Optional[Callable[[RegistrationResult], None]] = None) -> RegistrationResult:
         """
-        Запуск алгоритма.
+        Многоуровневый запуск алгоритма от грубого разрешения к полному.
+        На каждом уровне source и target прореживаются по воксельной сетке, найденное на уровне
+        преобразование служит начальным для следующего уровня. Дерево по полному target
+        используется только на последнем уровне. Метрики и число процессов общие для всех уровней.
 
         Args:
+            voxel_sizes (Sequence[float]): размеры вокселей прореженных уровней по убыванию.
+            max_iters (Optional[Sequence[int]]): число итераций для каждого прореженного уровня и для
+                последнего уровня полного разрешения, если None, то max_iter для всех уровней.
             debug (bool): дебаг.
-            ax (Optional[Axes3D]): matplotlib-оси, если None, то не рисуем.
-            pause_time (float): время задержки между отрисовкой шагов.
-        """
-        for i in range(self._max_iter):
-            penalty = self.calculate_penalty
-            if penalty < self._penalty_bound:
-                break
-            if debug:
-                print(penalty)
-
-            # Шаг алгоритма
-            self.icp_step()
-
-            # Отрисовка
-            if ax:
-                self._source.draw(ax, 'red')
-                self._target.draw(ax, 'green')
-                plt.pause(pause_time)
-                if i + 1 != self._max_iter:
-                    ax.cla()
+            on_iteration (Optional[Callable[[RegistrationResult], None]]): вызывается с состоянием после каждого шага
+                на всех уровнях; преобразование в состоянии относится к исходному source.
+
+        Returns:
+            RegistrationResult: итоговое преобразование source. iterations - сумма шагов по всем уровням,
+                elapsed - время всех уровней, stop_reason - причина остановки последнего уровня.
+
+        Raises:
+            ValueError: если размеры вокселей не убывают или число значений max_iters не равно len(voxel_sizes) + 1.
+        """
+        if any(larger <= smaller for larger, smaller in zip(voxel_sizes, voxel_sizes[1:])):
+            raise ValueError(f"Voxel sizes {list(voxel_sizes)} have to be in descending order")
+        if max_iters is None:
+            max_iters = [self._max_iter] * (len(voxel_sizes) + 1)
+        if len(max_iters) != len(voxel_sizes) + 1:
+            raise ValueError("max_iters have to contain one value per level and one for full resolution")
+
+        # Ограничение времени общее для всех уровней
+        def remaining() -> Optional[float]:
+            return None if self._time_budget is None else self._time_budget - (time.perf_counter() - start)
+
+        start = time.perf_counter()
+
+        for voxel_size, max_iter in zip(voxel_sizes, max_iters):
+            level = ICP(self._source.voxel_downsample(voxel_size), self._target.voxel_downsample(voxel_size),
+                        self._penalty_bound, max_iter, init_transform=self._transform, method=self._method,
+                        normals_k=self._normals_k, max_distance=self._max_distance, trim_ratio=self._trim_ratio,
+                        max_normal_angle=self._max_normal_angle, warm_start=self._warm_start,
+                        rotation_tol=self._rotation_tol, translation_tol=self._translation_tol,
+                        relative_tol=self._relative_tol, eps=self._eps, max_leaves=self._max_leaves,
+                        workers=self._workers, metrics=self._metrics)
+            level.icp_algorithm(debug, time_budget=remaining(), on_iteration=on_iteration)
+            self._transform = level.transformation
+            self._iterations += level.result.iterations
+
+        self.icp_algorithm(debug, max_iter=max_iters[-1], time_budget=remaining(), on_iteration=on_iteration)
+        self._elapsed = time.perf_counter() - start
+        return self.result
+
+    @staticmethod
+    def find_rigid_transform(source: np.ndarray, target: np.ndarray,
+                             metrics: Optional[ICPMetrics] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти поворот и сдвиг, переводящие точки source в соответствующие точки target
+        по методу наименьших квадратов (алгоритм Кабша).
+        Центры и матрица ковариации считаются в float64, даже если точки хранятся в float32.
+
+        Args:
+            source (np.ndarray): точки размера (N, 3).
+            target (np.ndarray): соответствующие точки размера (N, 3).
+            metrics (Optional[ICPMetrics]): метрики для замера фаз 'centroid' и 'svd'.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (матрица поворота, вектор сдвига): target ~ source @ R.T + t.
+        """
+        with ICPMetrics.optional_phase(metrics, 'centroid'):
+            source_center = source.mean(axis=0, dtype=np.float64)
+            target_center = target.mean(axis=0, dtype=np.float64)
+        with ICPMetrics.optional_phase(metrics, 'svd'):
+            s = (source - source_center).T @ (target - target_center)
+            u, _, vt = np.linalg.svd(s)
+        reflection = np.diag([1.0, 1.0, np.sign(np.linalg.det(vt.T @ u.T))])
+        rotation_matrix = vt.T @ reflection @ u.T
+        return rotation_matrix, target_center - rotation_matrix @ source_center
+
+    @staticmethod
+    def find_plane_transform(source: np.ndarray, target: np.ndarray,
+                             normals: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти поворот и сдвиг, минимизирующие сумму квадратов расстояний от точек source
+        до касательных плоскостей в соответствующих точках target.
+        Поворот линеаризуется (R ~ I + [w]x), параметры (w, t) находятся из системы 6x6,
+        затем w переводится в точную матрицу поворота формулой Родрига.
+
+        Args:
+            source (np.ndarray): точки размера (N, 3).
+            target (np.ndarray): соответствующие точки размера (N, 3).
+            normals (np.ndarray): нормали в точках target размера (N, 3).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (матрица поворота, вектор сдвига): target ~ source @ R.T + t.
+        """
+        a = np.hstack((np.cross(source, normals), normals))
+        b = np.einsum('ij,ij->i', target - source, normals)
+        x = np.linalg.lstsq(a.T @ a, a.T @ b, rcond=None)[0]
+
+        omega, translation = x[:3], x[3:]
+        angle = np.linalg.norm(omega)
+        if angle == 0:
+            return np.eye(3), translation
+        axis = omega / angle
+        k = np.array([[0, -axis[2], axis[1]], [axis[2], 0, -axis[0]], [-axis[1], axis[0], 0]])
+        rotation_matrix = np.eye(3) + np.sin(angle) * k + (1 - np.cos(angle)) * k @ k
+        return rotation_matrix, translation
@@ -0,0 +1,225 @@
+import numpy as np
+from typing import List, Optional, Tuple
+from KDTree import KDTree
+from Point import PointContainer
+from PointCloud import PointCloud
+from SpatialIndex import SpatialIndex
+
+
+class IncrementalKDTree(SpatialIndex):
+    """
+    Индекс с пакетной вставкой точек для растущей карты (scan-to-map).
+
+    Точки хранятся в лесе статических KDTree, размеры которых убывают больше чем вдвое (логарифмический метод):
+    новая пачка точек строится в отдельное дерево вместе с хвостовыми деревьями, которые не больше чем
+    вдвое крупнее накопленного объема. Деревьев не больше log2(N) + 1, каждая точка перестраивается
+    O(log N) раз за время жизни, поэтому стоимость вставки в среднем зависит от размера пачки, а не карты.
+    Запрос выполняется в каждом дереве, результаты объединяются.
+
+    При заданном voxel_size карта прореживается при вставке: в каждом вокселе остается первая попавшая в него точка.
+    """
+
+    STATS_KEYS = KDTree.STATS_KEYS
+    _KEY_BITS = 21
+
+    def __init__(self, voxel_size: Optional[float] = None, leaf_size: int = 16):
+        """
+        Инициализировать пустой индекс.
+
+        Args:
+            voxel_size (Optional[float]): размер ребра вокселя для прореживания карты, если None,
+                то сохраняются все вставленные точки.
+            leaf_size (int): максимальное число точек в листе деревьев.
+
+        Raises:
+            ValueError: если voxel_size не положителен или leaf_size < 1.
+        """
+
+        """
+        _buffer - точки в порядке вставки, занято _size первых строк, емкость растет вдвое.
+        _trees - деревья по убыванию размера, _ids - индексы их точек в _buffer.
+        _tree_of, _local - для каждой точки номер дерева и ее индекс в нем (для hint), емкость как у _buffer.
+        _voxels - ключи занятых вокселей.
+        """
+        if voxel_size is not None and voxel_size <= 0:
+            raise ValueError(f"Voxel size {voxel_size} have to be > 0")
+        if leaf_size < 1:
+            raise ValueError(f"Leaf size {leaf_size} have to be >= 1")
+        self._voxel_size = voxel_size
+        self._leaf_size = leaf_size
+
+        self._buffer = np.empty((0, 3))
+        self._size = 0
+        self._trees: List[KDTree] = []
+        self._ids: List[np.ndarray] = []
+        self._tree_of = np.empty(0, dtype=np.int64)
+        self._local = np.empty(0, dtype=np.int64)
+        self._voxels = set()
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        Точки карты в порядке вставки, без копирования.
+
+        Returns:
+            np.ndarray: массив точек размера (N, 3).
+        """
+        return self._buffer[:self._size]
+
+    @property
+    def voxel_size(self) -> Optional[float]:
+        return self._voxel_size
+
+    @property
+    def tree_count(self) -> int:
+        return len(self._trees)
+
+    def build(self, point_collection: PointContainer | np.ndarray):
+        """
+        Построить индекс заново по коллекции точек.
+
+        Args:
+            point_collection (PointContainer | np.ndarray): коллекция точек или массив размера (N, 3).
+        """
+        self._buffer = np.empty((0, 3))
+        self._size = 0
+        self._trees = []
+        self._ids = []
+        self._tree_of = np.empty(0, dtype=np.int64)
+        self._local = np.empty(0, dtype=np.int64)
+        self._voxels = set()
+        self.insert(point_collection)
+
+    def insert(self, point_collection: PointContainer | np.ndarray) -> np.ndarray:
+        """
+        Добавить пачку точек, например совмещенный кадр.
+
+        Args:
+            point_collection (PointContainer | np.ndarray): коллекция точек или массив размера (M, 3).
+
+        Raises:
+            ValueError: если при прореживании воксель точки слишком далек от начала координат.
+
+        Returns:
+            np.ndarray: индексы добавленных точек в self.points. При прореживании точки из занятых вокселей
+                не добавляются.
+        """
+        if isinstance(point_collection, np.ndarray):
+            points = point_collection
+        elif hasattr(point_collection, 'points'):
+            points = point_collection.points
+        else:
+            points = [list(point) for point in point_collection]
+        points = np.array(points, dtype=np.float64).reshape(-1, 3)
+        if self._voxel_size is not None:
+            points = points[self._new_voxels(points)]
+        if not len(points):
+            return np.empty(0, dtype=np.int64)
+
+        ids = np.arange(self._size, self._size + len(points))
+        if self._size + len(points) > len(self._buffer):
+            self._reserve(max(2 * len(self._buffer), self._size + len(points)))
+        self._buffer[ids] = points
+        self._size += len(points)
+
+        # Хвостовые деревья, которые не больше чем вдвое крупнее накопленного объема, перестраиваются вместе
+        # с пачкой, поэтому каждое оставшееся дерево больше нового более чем вдвое
+        merged = [ids]
+        total = len(ids)
+        while self._trees and len(self._ids[-1]) <= 2 * total:
+            self._trees.pop()
+            merged.append(self._ids.pop())
+            total += len(merged[-1])
+        ids = np.concatenate(merged)
+
+        tree = KDTree(PointCloud, leaf_size=self._leaf_size)
+        tree.build(PointCloud(self._buffer[ids]))
+        self._tree_of[ids] = len(self._trees)
+        self._local[ids] = np.arange(len(ids))
+        self._trees.append(tree)
+        self._ids.append(ids)
+        return merged[0]
+
+    def _reserve(self, capacity: int):
+        """
+        Увеличить емкость массивов точек, сохранив занятые строки.
+
+        Args:
+            capacity (int): новая емкость.
+        """
+        buffer = np.empty((capacity, 3))
+        buffer[:self._size] = self._buffer[:self._size]
+        self._buffer = buffer
+        for name in ('_tree_of', '_local'):
+            array = np.zeros(capacity, dtype=np.int64)
+            array[:self._size] = getattr(self, name)[:self._size]
+            setattr(self, name, array)
+
+    def _new_voxels(self, points: np.ndarray) -> np.ndarray:
+        """
+        Отобрать точки, попадающие в еще не занятые воксели, по одной на воксель, и занять эти воксели.
+
+        Args:
+            points (np.ndarray): массив точек размера (M, 3).
+
+        Raises:
+            ValueError: если воксель точки слишком далек от начала координат.
+
+        Returns:
+            np.ndarray: индексы отобранных точек по возрастанию.
+        """
+        limit = 2 ** (self._KEY_BITS - 1)
+        cells = np.floor(points / self._voxel_size)
+        if len(cells) and np.abs(cells).max() >= limit:
+            raise ValueError(f"Points have to lie within {limit} voxels of the origin")
+        cells = cells.astype(np.int64) + limit
+        keys = (cells[:, 0] << (2 * self._KEY_BITS)) | (cells[:, 1] << self._KEY_BITS) | cells[:, 2]
+        keys, first = np.unique(keys, return_index=True)
+        fresh = np.fromiter((key not in self._voxels for key in keys.tolist()), dtype=bool, count=len(keys))
+        self._voxels.update(keys[fresh].tolist())
+        return np.sort(first[fresh])
+
+    def query(self, points: np.ndarray, k: int = 1, max_distance: float = np.inf,
+              hint: Optional[np.ndarray] = None, stats: Optional[dict] = None,
+              eps: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти k ближайших соседей сразу для набора точек.
+        Запрос выполняется в каждом дереве леса, из найденных кандидатов выбираются k ближайших.
+
+        Args:
+            points (np.ndarray): массив точек-запросов размера (M, 3).
+            k (int): число соседей.
+            max_distance (float): радиус поиска.
+            hint (Optional[np.ndarray]): индексы точек-кандидатов размера (M,), например соседи с прошлой итерации ICP.
+                Кандидат передается дереву, в котором он хранится. Индексы вне [0, len(self.points)) игнорируются.
+            stats (Optional[dict]): счетчики обхода, к которым прибавляются значения STATS_KEYS по всем деревьям.
+            eps (float): допустимая относительная ошибка, 0 - точный поиск.
+
+        Raises:
+            ValueError: если k < 1, размерность точек не равна 3, hint задан при k > 1 или eps < 0.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (расстояния, индексы точек в self.points).
+            При k == 1 массивы имеют размер (M,), иначе (M, k).
+            Недостающие соседи (в том числе дальше max_distance) имеют расстояние inf и индекс len(self.points).
+        """
+        points = self._check_query(points, k, eps, 3)
+        if hint is not None:
+            hint = self._check_hint(hint, k, len(points))
+            valid = np.flatnonzero((hint >= 0) & (hint < self._size))
+            hint_tree, hint_local = self._tree_of[hint[valid]], self._local[hint[valid]]
+
+        best_dist, best_index = self._start_query(points, k, max_distance, None)
+        queries = np.arange(len(points))
+        for tree_index, (tree, ids) in enumerate(zip(self._trees, self._ids)):
+            tree_hint = None
+            if hint is not None:
+                tree_hint = np.full(len(points), -1, dtype=np.int64)
+                own = hint_tree == tree_index
+                tree_hint[valid[own]] = hint_local[own]
+            dist, indices = tree.query(points, k, max_distance, tree_hint, stats, eps)
+            found = indices < len(ids)
+            indices = np.where(found, ids[np.where(found, indices, 0)], self._size)
+            self._push_candidates(best_dist, best_index, queries, np.square(dist).reshape(len(points), k),
+                                  indices.reshape(len(points), k))
+        return self._finish_query(best_dist, best_index)
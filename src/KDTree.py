@@ -1,13 +1,37 @@
+import heapq
 import itertools
-from recordtype import recordtype
-from typing import List, Tuple, Type
+import json
+import numpy as np
+from typing import TYPE_CHECKING, List, Optional, Tuple, Type
 from Point import Point, PointContainer
 from Point3D import Point3D
+from SpatialIndex import SpatialIndex
 
-MinMax = recordtype('MinMax', 'min max')
+if TYPE_CHECKING:
+    from multiprocessing.shared_memory import SharedMemory
+
+
+class MinMax:
+    """
+    Границы boundary box по одной координате.
+    """
+
+    __slots__ = ('min', 'max')
+
+    def __init__(self, min: float, max: float):
+        self.min = min
+        self.max = max
+
+    def __eq__(self, other):
+        return isinstance(other, MinMax) and (self.min, self.max) == (other.min, other.max)
+
+    def __repr__(self):
+        return f"MinMax(min={self.min}, max={self.max})"
 
 
 class BoundaryBox:
+    __slots__ = ('_dimension', '_bounds', '_cls')
+
     def __init__(self, cls: Type[Point], inf: float = 10e8):
         """
         Инициализировать boundary box.
@@ -57,46 +81,71 @@ class BoundaryBox:
             self._bounds[i].min = min(self._bounds[i].min, coordinate)
             self._bounds[i].max = max(self._bounds[i].max, coordinate)
 
-    def distance(self, point: Point) -> float:
+    def distance_squared(self, point: Point) -> float:
         """
-        Расстояние до точки
+        Квадрат расстояния до точки.
+        Координаты точки прижимаются к границам box, поэтому расчет точен и не создает промежуточных объектов.
 
         Args:
             point (Point): точка.
 
         Returns:
-            float- расстояние.
+            float: квадрат расстояния, 0 если точка внутри box.
         """
         if type(point) != self._cls:
             raise AttributeError(f"Point have to be {self._cls}")
 
-        # If point inside box then distance is 0
-        if all(self._bounds[i].min <= coord <= self._bounds[i].max for i, coord in enumerate(point)):
-            return 0
+        res = 0.0
+        for bound, coord in zip(self._bounds, point):
+            if coord < bound.min:
+                res += (bound.min - coord) * (bound.min - coord)
+            elif coord > bound.max:
+                res += (coord - bound.max) * (coord - bound.max)
+        return res
 
-        # Find min distance to vertexes
-        res = min(point.distance(vertex) for vertex in self.vertexes)
+    def distance(self, point: Point) -> float:
+        """
+        Расстояние до точки
 
-        # Find min distance to faces
-        for i in range(self._dimension):
-            if all(self._bounds[j].min <= coord <= self._bounds[j].max for j, coord in enumerate(point) if i != j):
-                res = min(res, abs(self._bounds[i].min - point[i]), abs(self._bounds[i].max - point[i]))
+        Args:
+            point (Point): точка.
 
-        return res
+        Returns:
+            float- расстояние.
+        """
+        return np.sqrt(self.distance_squared(point))
 
 
-class KDTree:
+class KDTree(SpatialIndex):
     """
     K-d дерево.
+
+    Дерево хранится в плоских numpy-массивах: для каждой вершины известны измерение и значение разбиения,
+    границы boundary box, индексы потомков и диапазон [start, end) в массиве перестановки точек.
+    Листья содержат до leaf_size точек.
     """
 
-    def __init__(self, container_cls: Type[PointContainer], inf=10e8):
+    _ARRAY_NAMES = ('_points', '_indices', '_split_dim', '_split_value', '_lo', '_hi', '_left', '_right', '_start',
+                    '_end')
+    _FILE_SIGNATURE = b'KDTREE01'
+    STATS_KEYS = ('nodes_visited', 'boxes_pruned', 'leaf_distance_evaluations')
+    _FILE_ALIGNMENT = 64
+
+    def __init__(self, container_cls: Type[PointContainer], inf=10e8, leaf_size: int = 16,
+                 dtype: Optional[np.dtype] = None):
         """
         Инициализировать K-d дерево на основе контейнера точек.
 
         Args:
             container_cls (Type[PointContainer]): класс контейнера точек.
             inf (float): бесконечно большое число, заведомо больше любой координаты точки.
+            leaf_size (int): максимальное число точек в листе.
+            dtype (Optional[np.dtype]): тип хранения точек и границ вершин, float32 или float64. Если None,
+                то float32, когда точки коллекции хранятся в float32, иначе float64.
+                Расстояния до запросов всегда считаются в float64.
+
+        Raises:
+            ValueError: если leaf_size < 1 или dtype не float32 и не float64.
         """
 
         """
@@ -104,81 +153,545 @@ class KDTree:
         _cls - класс точек.
         _dimension - размерность точек.
         _inf - бесконечно большое число.
+        _leaf_size - максимальное число точек в листе.
+        _dtype - запрошенный тип хранения точек, None - по типу коллекции.
+
+        _points - точки дерева в исходном порядке.
+        _indices - перестановка индексов точек, точки каждой вершины занимают отрезок [_start, _end).
+        _split_dim, _split_value - измерение и значение разбиения вершины (-1 для листьев).
+        _lo, _hi - границы boundary box вершин.
+        _left, _right - индексы потомков (-1 для листьев).
         """
+        if leaf_size < 1:
+            raise ValueError(f"Leaf size {leaf_size} have to be >= 1")
+        if dtype is not None and np.dtype(dtype) not in (np.float32, np.float64):
+            raise ValueError(f"Dtype {np.dtype(dtype)} have to be float32 or float64")
         self._container_cls = container_cls
         self._cls = container_cls.point_class()
         self._dimension = container_cls.point_class().dimension()
         self._inf = inf
+        self._leaf_size = leaf_size
+        self._dtype = None if dtype is None else np.dtype(dtype)
+
+        self._points = np.empty((0, self._dimension))
+        self._indices = np.empty(0, dtype=np.int64)
+        self._split_dim = np.empty(0, dtype=np.int64)
+        self._split_value = np.empty(0)
+        self._lo = np.empty((0, self._dimension))
+        self._hi = np.empty((0, self._dimension))
+        self._left = np.empty(0, dtype=np.int64)
+        self._right = np.empty(0, dtype=np.int64)
+        self._start = np.empty(0, dtype=np.int64)
+        self._end = np.empty(0, dtype=np.int64)
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        Точки, по которым построено дерево, в исходном порядке.
+
+        Returns:
+            np.ndarray: массив точек размера (N, dimension).
+        """
+        return self._points
+
+    @property
+    def leaf_size(self) -> int:
+        return self._leaf_size
 
-        self._tree = [BoundaryBox(self._cls, self._inf)] * 2
-        self._left_child_index, self._right_child_index = [-1] * 2, [-1] * 2
+    @property
+    def dtype(self) -> np.dtype:
+        return self._points.dtype
+
+    @property
+    def node_count(self) -> int:
+        return len(self._left)
 
-    def _add_node(self):
+    @property
+    def boundary_box(self) -> BoundaryBox:
         """
-        Добавить пустую вершину к дереву.
+        Boundary box всего дерева.
+
+        Returns:
+            BoundaryBox: границы корня дерева.
+        """
+        box = BoundaryBox(self._cls, self._inf)
+        if self.node_count:
+            for bound, lo, hi in zip(box.bounds, self._lo[0], self._hi[0]):
+                bound.min, bound.max = lo, hi
+        return box
+
+    def _arrays(self) -> dict:
         """
-        self._tree.append(BoundaryBox(self._cls, self._inf))
-        self._left_child_index.append(-1)
-        self._right_child_index.append(-1)
+        Плоские массивы, полностью описывающие построенное дерево.
 
-    def build(self, point_collection: PointContainer, tree_index: int = 1, coordinate: int = 0):
+        Returns:
+            dict: имя атрибута -> массив.
+        """
+        return {name: getattr(self, name) for name in self._ARRAY_NAMES}
+
+    def _layout(self, alignment: int = 8) -> Tuple[List[Tuple[str, str, Tuple[int, ...], int]], int]:
+        """
+        Расположение массивов дерева в одном непрерывном блоке памяти.
+
+        Args:
+            alignment (int): выравнивание начала каждого массива в байтах.
+
+        Returns:
+            Tuple[List[Tuple[str, str, Tuple[int, ...], int]], int] - ([(имя, dtype, размер, смещение)], размер блока).
+        """
+        layout, offset = [], 0
+        for name, array in self._arrays().items():
+            layout.append((name, array.dtype.str, tuple(array.shape), offset))
+            offset += -(-array.nbytes // alignment) * alignment
+        return layout, offset
+
+    def share(self) -> Tuple['SharedMemory', dict]:
+        """
+        Скопировать массивы дерева в общую память, чтобы другие процессы могли подключиться к ней без pickle.
+        Вызывающий владеет блоком общей памяти и должен вызвать у него close() и unlink().
+
+        Returns:
+            Tuple[SharedMemory, dict] - (блок общей памяти, описание дерева для KDTree.attach).
+        """
+        from multiprocessing.shared_memory import SharedMemory
+
+        layout, size = self._layout()
+        shared_memory = SharedMemory(create=True, size=max(size, 1))
+        for (name, dtype, shape, array_offset), array in zip(layout, self._arrays().values()):
+            np.ndarray(shape, dtype=dtype, buffer=shared_memory.buf, offset=array_offset)[...] = array
+
+        descriptor = {
+            'name': shared_memory.name,
+            'layout': layout,
+            'container_cls': self._container_cls,
+            'inf': self._inf,
+            'leaf_size': self._leaf_size,
+        }
+        return shared_memory, descriptor
+
+    @classmethod
+    def attach(cls, descriptor: dict) -> 'KDTree':
+        """
+        Подключиться к дереву, размещенному в общей памяти методом share. Массивы не копируются.
+
+        Args:
+            descriptor (dict): описание дерева, возвращенное share.
+
+        Returns:
+            KDTree: дерево, массивы которого являются представлениями общей памяти.
+        """
+        from multiprocessing.shared_memory import SharedMemory
+
+        tree = cls(descriptor['container_cls'], descriptor['inf'], descriptor['leaf_size'])
+        tree._shared_memory = SharedMemory(name=descriptor['name'])
+        for name, dtype, shape, offset in descriptor['layout']:
+            setattr(tree, name, np.ndarray(shape, dtype=dtype, buffer=tree._shared_memory.buf, offset=offset))
+        return tree
+
+    def save(self, path: str):
+        """
+        Сохранить дерево в файл.
+        Формат: сигнатура, длина заголовка (uint64), JSON-заголовок с параметрами дерева и расположением
+        массивов, затем сами массивы, выровненные по _FILE_ALIGNMENT байт.
+
+        Args:
+            path (str): путь к файлу.
+        """
+        layout, _ = self._layout(self._FILE_ALIGNMENT)
+        header = json.dumps({
+            'dimension': self._dimension,
+            'inf': self._inf,
+            'leaf_size': self._leaf_size,
+            'layout': layout,
+        }).encode('utf-8')
+        data_offset = self._data_offset(len(header))
+
+        with open(path, 'wb') as file:
+            file.write(self._FILE_SIGNATURE)
+            file.write(np.uint64(len(header)).tobytes())
+            file.write(header)
+            for (_, _, _, offset), array in zip(layout, self._arrays().values()):
+                file.seek(data_offset + offset)
+                file.write(np.ascontiguousarray(array).tobytes())
+
+    @classmethod
+    def load(cls, path: str, container_cls: Type[PointContainer], mmap: bool = True) -> 'KDTree':
+        """
+        Загрузить дерево, сохраненное методом save.
+        При mmap массивы отображаются из файла через np.memmap: загрузка не читает данные,
+        а процессы, загрузившие один файл, разделяют страницы в кэше ОС.
+
+        Args:
+            path (str): путь к файлу.
+            container_cls (Type[PointContainer]): класс контейнера точек.
+            mmap (bool): отобразить массивы из файла, иначе прочитать их в память.
+
+        Raises:
+            ValueError: если файл не является сохраненным деревом или размерность не совпадает.
+
+        Returns:
+            KDTree: загруженное дерево (при mmap массивы доступны только для чтения).
+        """
+        with open(path, 'rb') as file:
+            if file.read(len(cls._FILE_SIGNATURE)) != cls._FILE_SIGNATURE:
+                raise ValueError(f"{path} is not a saved KDTree")
+            header_size = int(np.frombuffer(file.read(8), dtype=np.uint64)[0])
+            header = json.loads(file.read(header_size).decode('utf-8'))
+
+        tree = cls(container_cls, header['inf'], header['leaf_size'])
+        if header['dimension'] != tree._dimension:
+            raise ValueError(f"Tree dimension {header['dimension']} is not {tree._dimension}")
+        data_offset = cls._data_offset(header_size)
+        for name, dtype, shape, offset in header['layout']:
+            if mmap and int(np.prod(shape)):
+                array = np.memmap(path, dtype=dtype, mode='r', offset=data_offset + offset, shape=tuple(shape))
+            else:
+                array = np.fromfile(path, dtype=dtype, count=int(np.prod(shape)), offset=data_offset + offset)
+            setattr(tree, name, array.reshape(shape))
+        return tree
+
+    @classmethod
+    def _data_offset(cls, header_size: int) -> int:
+        """
+        Смещение начала массивов в файле.
+
+        Args:
+            header_size (int): длина JSON-заголовка в байтах.
+
+        Returns:
+            int: смещение, выровненное по _FILE_ALIGNMENT.
+        """
+        offset = len(cls._FILE_SIGNATURE) + 8 + header_size
+        return -(-offset // cls._FILE_ALIGNMENT) * cls._FILE_ALIGNMENT
+
+    def build(self, point_collection: PointContainer):
         """
         Построить дерево по коллекции точек
 
         Args:
             point_collection (PointContainer): коллекция точек.
-            tree_index (PointContainer): текущий индекс элемента дерева.
-            coordinate (int): координата точки на текущей итерации.
         """
         if point_collection.point_class() != self._cls:
             raise AttributeError(f"Container have to contain {self._cls} objects")
 
-        for point in point_collection:
-            self._tree[tree_index].update(point)
-        if len(point_collection) <= 1:
-            return
+        if hasattr(point_collection, 'points'):
+            points = point_collection.points
+        else:
+            points = [list(point) for point in point_collection]
+        dtype = self._dtype
+        if dtype is None:
+            dtype = np.float32 if isinstance(points, np.ndarray) and points.dtype == np.float32 else np.float64
+        self._points = np.array(points, dtype=dtype)
+        self._points = self._points.reshape(-1, self._dimension)
+        self._indices = np.arange(len(self._points))
+
+        nodes = {name: [] for name in ('split_dim', 'split_value', 'lo', 'hi', 'left', 'right', 'start', 'end')}
+        stack = [(0, len(self._points), -1, None)]
+        while stack:
+            start, end, parent, side = stack.pop()
+            tree_index = self._add_node(nodes, start, end)
+            if parent != -1:
+                nodes[side][parent] = tree_index
+            middle = self._split_node(nodes, tree_index)
+            if middle is not None:
+                stack.append((middle, end, tree_index, 'right'))
+                stack.append((start, middle, tree_index, 'left'))
+
+        self._split_dim = np.array(nodes['split_dim'], dtype=np.int64)
+        self._split_value = np.array(nodes['split_value'], dtype=self._points.dtype)
+        self._lo = np.array(nodes['lo'], dtype=self._points.dtype).reshape(-1, self._dimension)
+        self._hi = np.array(nodes['hi'], dtype=self._points.dtype).reshape(-1, self._dimension)
+        self._left = np.array(nodes['left'], dtype=np.int64)
+        self._right = np.array(nodes['right'], dtype=np.int64)
+        self._start = np.array(nodes['start'], dtype=np.int64)
+        self._end = np.array(nodes['end'], dtype=np.int64)
+
+    def _add_node(self, nodes: dict, start: int, end: int) -> int:
+        """
+        Добавить лист над отрезком [start, end) массива перестановки точек.
+
+        Args:
+            nodes (dict): списки атрибутов вершин.
+            start (int): начало отрезка.
+            end (int): конец отрезка.
+
+        Returns:
+            int: индекс добавленной вершины.
+        """
+        points = self._points[self._indices[start:end]]
+        lo = points.min(axis=0) if len(points) else np.full(self._dimension, self._inf)
+        hi = points.max(axis=0) if len(points) else np.full(self._dimension, -self._inf)
+        for name, value in (('split_dim', -1), ('split_value', 0.0), ('lo', lo), ('hi', hi), ('left', -1),
+                            ('right', -1), ('start', start), ('end', end)):
+            nodes[name].append(value)
+        return len(nodes['left']) - 1
+
+    def _split_node(self, nodes: dict, tree_index: int) -> Optional[int]:
+        """
+        Разбить вершину по медиане измерения с наибольшим разбросом за линейное время (np.argpartition).
+
+        Args:
+            nodes (dict): списки атрибутов вершин.
+            tree_index (int): индекс вершины.
 
-        point_collection.sort(key=lambda p: (p[coordinate]))
+        Returns:
+            Optional[int]: граница между отрезками потомков или None, если вершина остается листом.
+        """
+        start, end = nodes['start'][tree_index], nodes['end'][tree_index]
+        lo, hi = nodes['lo'][tree_index], nodes['hi'][tree_index]
+        split_dim = int(np.argmax(hi - lo))
+        if end - start <= self._leaf_size or hi[split_dim] == lo[split_dim]:
+            return None
+
+        indices = self._indices[start:end]
+        middle = (end - start) // 2
+        order = np.argpartition(self._points[indices, split_dim], middle)
+        self._indices[start:end] = indices[order]
+
+        nodes['split_dim'][tree_index] = split_dim
+        nodes['split_value'][tree_index] = self._points[indices[order[middle]], split_dim]
+        return start + middle
+
+    def _box_distance_squared(self, tree_index: int | np.ndarray, points: np.ndarray) -> np.ndarray:
+        """
+        Квадраты расстояний от набора точек до boundary box вершины.
 
-        # Initialize left sub-tree
-        self._add_node()
-        self._left_child_index[tree_index] = len(self._tree) - 1
-        self.build(self._container_cls(point_collection[len(point_collection) // 2:]),
-                   self._left_child_index[tree_index],
-                   (coordinate + 1) % self._dimension)
+        Args:
+            tree_index (int | np.ndarray): индекс вершины дерева или массив индексов размера (M,),
+                своя вершина для каждой точки.
+            points (np.ndarray): массив точек размера (M, dimension).
 
-        # Initialize right sub-tree
-        self._add_node()
-        self._right_child_index[tree_index] = len(self._tree) - 1
-        self.build(self._container_cls(point_collection[:len(point_collection) // 2]),
-                   self._right_child_index[tree_index],
-                   (coordinate + 1) % self._dimension)
+        Returns:
+            np.ndarray: квадраты расстояний размера (M,).
+        """
+        delta = np.maximum(self._lo[tree_index] - points, 0) + np.maximum(points - self._hi[tree_index], 0)
+        return np.sum(np.square(delta), axis=-1)
 
-    def find_closest(self, point: Point) -> Tuple[float, Point]:
+    def _descend(self, points: np.ndarray, stats: Optional[dict] = None) -> np.ndarray:
+        """
+        Спуститься от корня до листа для всех точек одновременно,
+        выбирая на каждом разбиении потомка с ближайшим boundary box.
+
+        Args:
+            points (np.ndarray): массив точек размера (M, dimension).
+            stats (Optional[dict]): счетчики обхода, пройденные внутренние вершины добавляются к nodes_visited.
+
+        Returns:
+            np.ndarray: индексы листов размера (M,).
+        """
+        nodes = np.zeros(len(points), dtype=np.int64)
+        active = np.arange(len(points)) if self._left[0] != -1 else np.empty(0, dtype=np.int64)
+        while len(active):
+            if stats is not None:
+                stats['nodes_visited'] += len(active)
+            left, right = self._left[nodes[active]], self._right[nodes[active]]
+            closer = (self._box_distance_squared(left, points[active]) <=
+                      self._box_distance_squared(right, points[active]))
+            nodes[active] = np.where(closer, left, right)
+            active = active[self._left[nodes[active]] != -1]
+        return nodes
+
+    def _search_leaves(self, points: np.ndarray, best_dist: np.ndarray, best_index: np.ndarray, leaves: np.ndarray,
+                       stats: Optional[dict]):
+        """
+        Обновить списки k ближайших соседей точками своего листа для каждого запроса.
+
+        Args:
+            points (np.ndarray): массив точек-запросов размера (M, dimension).
+            best_dist (np.ndarray): отсортированные квадраты расстояний до текущих соседей (M, k).
+            best_index (np.ndarray): индексы текущих соседей (M, k).
+            leaves (np.ndarray): индексы листов размера (M,).
+            stats (Optional[dict]): счетчики обхода.
+        """
+        if not len(leaves):
+            return
+        sizes = self._end[leaves] - self._start[leaves]
+        if stats is not None:
+            stats['nodes_visited'] += len(leaves)
+            stats['leaf_distance_evaluations'] += int(sizes.sum())
+        width = int(sizes.max())
+        rows = max(1, 2 ** 20 // width)
+        for start in range(0, len(leaves), rows):
+            chunk = np.arange(start, min(start + rows, len(leaves)))
+            positions = self._start[leaves[chunk], None] + np.arange(width)
+            valid = positions < self._end[leaves[chunk], None]
+            indices = self._indices[np.where(valid, positions, self._start[leaves[chunk], None])]
+            dist = np.sum(np.square(points[chunk, None, :] - self._points[indices]), axis=2)
+            dist[~valid] = np.inf
+            self._push_candidates(best_dist, best_index, chunk, dist, indices)
+
+    def _leaf_points(self, tree_index: int) -> np.ndarray:
+        """
+        Индексы точек листа.
+
+        Args:
+            tree_index (int): индекс листа.
+
+        Returns:
+            np.ndarray: индексы точек в self._points.
+        """
+        return self._indices[self._start[tree_index]:self._end[tree_index]]
+
+    def find_closest(self, point: Point, stats: Optional[dict] = None, eps: float = 0.0,
+                     max_leaves: Optional[int] = None) -> Tuple[float, Point]:
         """
         Найти ближайшего соседа к точке.
 
         Args:
             point (Point): точка.
+            stats (Optional[dict]): счетчики обхода, к которым прибавляются значения STATS_KEYS.
+            eps (float): допустимая относительная ошибка. Поддерево отсекается, если оно не может улучшить
+                результат больше чем в (1 + eps) раз, найденная точка дальше ближайшей не больше чем в (1 + eps) раз.
+            max_leaves (Optional[int]): максимальное число просмотренных листьев, если None, то не ограничено.
+                При ограничении найденная точка может быть дальше, чем допускает eps.
+
+        Raises:
+            ValueError: если eps < 0 или max_leaves < 1.
 
         Returns:
              Tuple[float, Point] - (расстояние до ближайшей точки, ближайшая точка).
         """
 
-        def _find_closest(tree_index=1):
-            nonlocal min_dist, res
-            if self._left_child_index[tree_index] == -1:
-                min_dist = self._tree[tree_index].distance(point)
-                res = self._cls(*[self._tree[tree_index].bounds[i].min for i in range(self._dimension)])
-                return
-            if self._tree[self._left_child_index[tree_index]].distance(point) < min_dist:
-                _find_closest(self._left_child_index[tree_index])
-            if self._tree[self._right_child_index[tree_index]].distance(point) < min_dist:
-                _find_closest(self._right_child_index[tree_index])
-
         if type(point) != self._cls:
             raise AttributeError(f"Point have to be {self._cls}")
-        min_dist = self._inf
-        res = self._cls()
-        _find_closest()
-        return min_dist, res
+        scale = self._approximation_scale(eps, max_leaves)
+        coordinates = np.array(list(point), dtype=np.float64)
+        min_dist = self._inf * self._inf
+        res = -1
+        leaves = 0
+
+        # Обход в порядке возрастания расстояния до boundary box
+        heap = [(0.0, 0)] if len(self._points) else []
+        while heap:
+            box_dist, tree_index = heapq.heappop(heap)
+            if box_dist * scale >= min_dist or leaves == max_leaves:
+                if stats is not None:
+                    stats['boxes_pruned'] += len(heap) + 1
+                break
+            if stats is not None:
+                stats['nodes_visited'] += 1
+            if self._left[tree_index] == -1:
+                leaves += 1
+                indices = self._leaf_points(tree_index)
+                if stats is not None:
+                    stats['leaf_distance_evaluations'] += len(indices)
+                dist = np.sum(np.square(self._points[indices] - coordinates), axis=1)
+                closest = np.argmin(dist)
+                if dist[closest] < min_dist:
+                    min_dist, res = dist[closest], indices[closest]
+                continue
+            for child in (self._left[tree_index], self._right[tree_index]):
+                child_dist = self._box_distance_squared(child, coordinates)
+                if child_dist * scale < min_dist:
+                    heapq.heappush(heap, (child_dist, child))
+                elif stats is not None:
+                    stats['boxes_pruned'] += 1
+
+        if res == -1:
+            return self._inf, self._cls()
+        return np.sqrt(min_dist), self._cls(*self._points[res])
+
+    @staticmethod
+    def _approximation_scale(eps: float, max_leaves: Optional[int]) -> float:
+        """
+        Проверить параметры приближенного поиска.
+
+        Args:
+            eps (float): допустимая относительная ошибка.
+            max_leaves (Optional[int]): максимальное число просмотренных листьев.
+
+        Raises:
+            ValueError: если eps < 0 или max_leaves < 1.
+
+        Returns:
+            float: множитель (1 + eps)^2 для квадратов расстояний до boundary box.
+        """
+        if eps < 0:
+            raise ValueError(f"eps = {eps} have to be >= 0")
+        if max_leaves is not None and max_leaves < 1:
+            raise ValueError(f"Max leaves {max_leaves} have to be >= 1")
+        return (1 + eps) ** 2
+
+    def query(self, points: np.ndarray, k: int = 1, max_distance: float = np.inf,
+              hint: Optional[np.ndarray] = None, stats: Optional[dict] = None, eps: float = 0.0,
+              max_leaves: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти k ближайших соседей сразу для набора точек.
+        Обход дерева выполняется для всех запросов одновременно: в каждой вершине
+        расстояния до boundary box считаются векторно для группы запросов, которые до нее дошли,
+        а в листе сразу для всех точек листа.
+
+        Args:
+            points (np.ndarray): массив точек-запросов размера (M, dimension).
+            k (int): число соседей.
+            max_distance (float): радиус поиска. Поддеревья дальше радиуса отсекаются при обходе.
+            hint (Optional[np.ndarray]): индексы точек-кандидатов размера (M,), например соседи с прошлой итерации ICP.
+                Расстояние до кандидата используется как начальная верхняя граница, поэтому отсечение
+                работает с первой вершины. Результат остается точным. Индексы вне [0, len(self.points)) игнорируются.
+            stats (Optional[dict]): счетчики обхода, к которым прибавляются значения STATS_KEYS
+                (посещения и отсечения считаются для пар запрос-вершина).
+            eps (float): допустимая относительная ошибка, как в find_closest: i-й найденный сосед
+                дальше истинного i-го соседа не больше чем в (1 + eps) раз.
+            max_leaves (Optional[int]): максимальное число просмотренных листьев на запрос, если None, то не ограничено.
+
+        Raises:
+            ValueError: если k < 1, размерность точек не совпадает с размерностью дерева,
+                hint задан при k > 1, eps < 0 или max_leaves < 1.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (расстояния, индексы точек в self.points).
+            При k == 1 массивы имеют размер (M,), иначе (M, k).
+            Недостающие соседи (в том числе дальше max_distance) имеют расстояние inf и индекс len(self.points).
+        """
+        points = self._check_query(points, k, eps, self._dimension)
+        scale = self._approximation_scale(eps, max_leaves)
+        best_dist, best_index = self._start_query(points, k, max_distance, hint)
+
+        # Без hint каждый запрос сначала спускается в лист, к которому он ближе на каждом разбиении: это дает
+        # начальную границу для отсечения и первый лист при ограничении листьев, так как групповой обход ниже
+        # идет в порядке, общем для всех запросов группы. С hint граница уже есть, и спуск только замедляет поиск
+        first_leaf = None
+        if len(self._points) and (hint is None or max_leaves is not None):
+            first_leaf = self._descend(points, stats)
+            self._search_leaves(points, best_dist, best_index, first_leaf, stats)
+        leaves = np.ones(len(points), dtype=np.int64) if max_leaves is not None else None
+        stack = [(0, np.arange(len(points)), np.zeros(len(points)))] if len(self._points) else []
+        while stack:
+            tree_index, queries, box_dist = stack.pop()
+            mask = box_dist * scale < best_dist[queries, -1]
+            if leaves is not None:
+                mask &= leaves[queries] < max_leaves
+            queries = queries[mask]
+            if stats is not None:
+                stats['boxes_pruned'] += len(box_dist) - len(queries)
+            if first_leaf is not None and self._left[tree_index] == -1:
+                # Свой лист запрос уже просмотрел после спуска
+                queries = queries[first_leaf[queries] != tree_index]
+            if stats is not None:
+                stats['nodes_visited'] += len(queries)
+            if not len(queries):
+                continue
+
+            if self._left[tree_index] == -1:
+                indices = self._leaf_points(tree_index)
+                if leaves is not None:
+                    leaves[queries] += 1
+                if stats is not None:
+                    stats['leaf_distance_evaluations'] += len(queries) * len(indices)
+                dist = np.sum(np.square(points[queries, None, :] - self._points[indices][None, :, :]), axis=2)
+                self._push_candidates(best_dist, best_index, queries, dist, indices)
+                continue
+
+            children = []
+            for child in (self._left[tree_index], self._right[tree_index]):
+                dist = self._box_distance_squared(child, points[queries])
+                mask = dist * scale < best_dist[queries, -1]
+                if stats is not None:
+                    stats['boxes_pruned'] += len(mask) - np.count_nonzero(mask)
+                if np.any(mask):
+                    children.append((child, queries[mask], dist[mask]))
+            # Ближайший в среднем потомок обходится первым
+            children.sort(key=lambda item: -np.mean(item[2]))
+            stack.extend(children)
+
+        return self._finish_query(best_dist, best_index)
@@ -0,0 +1,102 @@
+import time
+from contextlib import contextmanager, nullcontext
+from typing import Callable, Dict, List, Optional
+
+
+class ICPMetrics:
+    """
+    Сбор метрик итераций ICP: время фаз (поиск соседей, отбор пар, центры масс, SVD, обновление преобразования)
+    и счетчики обхода KDTree. Передается в ICP параметром metrics; без него ICP метрики не собирает.
+    """
+
+    def __init__(self, callback: Optional[Callable[[int, dict], None]] = None):
+        """
+        Инициализировать сбор метрик.
+
+        Args:
+            callback (Optional[Callable[[int, dict], None]]): вызывается в конце каждой итерации
+                с ее номером и метриками {'timings': {...}, 'counters': {...}}.
+        """
+        self._callback = callback
+        self._iterations: List[dict] = []
+
+    @property
+    def iterations(self) -> List[dict]:
+        """
+        Метрики всех итераций.
+
+        Returns:
+            List[dict]: для каждой итерации {'timings': {фаза: секунды}, 'counters': {счетчик: значение}}.
+        """
+        return self._iterations
+
+    def start_iteration(self):
+        """
+        Начать новую итерацию.
+        """
+        self._iterations.append({'timings': {}, 'counters': {}})
+
+    def end_iteration(self):
+        """
+        Завершить текущую итерацию и передать ее метрики в callback.
+        """
+        if self._callback is not None and self._iterations:
+            self._callback(len(self._iterations) - 1, self._iterations[-1])
+
+    @contextmanager
+    def phase(self, name: str):
+        """
+        Замерить время фазы текущей итерации. Повторные замеры одной фазы складываются.
+
+        Args:
+            name (str): имя фазы.
+        """
+        if not self._iterations:
+            self.start_iteration()
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            timings = self._iterations[-1]['timings']
+            timings[name] = timings.get(name, 0.0) + time.perf_counter() - start
+
+    @staticmethod
+    def optional_phase(metrics: Optional['ICPMetrics'], name: str):
+        """
+        Замер фазы, если метрики собираются, иначе пустой контекст без накладных расходов на замер.
+
+        Args:
+            metrics (Optional[ICPMetrics]): метрики или None.
+            name (str): имя фазы.
+
+        Returns:
+            контекстный менеджер замера.
+        """
+        return nullcontext() if metrics is None else metrics.phase(name)
+
+    def count(self, name: str, value: int):
+        """
+        Прибавить значение к счетчику текущей итерации.
+
+        Args:
+            name (str): имя счетчика.
+            value (int): прибавляемое значение.
+        """
+        if not self._iterations:
+            self.start_iteration()
+        counters = self._iterations[-1]['counters']
+        counters[name] = counters.get(name, 0) + int(value)
+
+    def totals(self) -> Dict[str, Dict[str, float]]:
+        """
+        Суммы времени фаз и счетчиков по всем итерациям.
+
+        Returns:
+            Dict[str, Dict[str, float]]: {'timings': {...}, 'counters': {...}}.
+        """
+        result = {'timings': {}, 'counters': {}}
+        for iteration in self._iterations:
+            for group in result:
+                for name, value in iteration[group].items():
+                    result[group][name] = result[group].get(name, 0) + value
+        return result
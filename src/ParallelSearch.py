@@ -0,0 +1,124 @@
+import weakref
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional, Tuple
+import numpy as np
+from KDTree import KDTree
+
+_worker_tree: Optional[KDTree] = None
+
+
+def _attach(descriptor: dict):
+    """
+    Инициализатор процесса-исполнителя: подключиться к дереву в общей памяти.
+
+    Args:
+        descriptor (dict): описание дерева, возвращенное KDTree.share.
+    """
+    global _worker_tree
+    _worker_tree = KDTree.attach(descriptor)
+
+
+def _query(points: np.ndarray, k: int, max_distance: float, hint: Optional[np.ndarray], collect_stats: bool,
+           eps: float, max_leaves: Optional[int]) -> Tuple[np.ndarray, np.ndarray, Optional[dict]]:
+    """
+    Поиск ближайших соседей для части точек в процессе-исполнителе.
+
+    Args:
+        points (np.ndarray): массив точек-запросов.
+        k (int): число соседей.
+        max_distance (float): радиус поиска.
+        hint (Optional[np.ndarray]): индексы точек-кандидатов.
+        collect_stats (bool): собирать счетчики обхода.
+        eps (float): допустимая относительная ошибка.
+        max_leaves (Optional[int]): максимальное число просмотренных листьев на запрос.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray, Optional[dict]] - (расстояния, индексы, счетчики обхода или None).
+    """
+    stats = dict.fromkeys(KDTree.STATS_KEYS, 0) if collect_stats else None
+    return (*_worker_tree.query(points, k, max_distance, hint, stats, eps, max_leaves), stats)
+
+
+def _release(executor: ProcessPoolExecutor, shared_memory):
+    """
+    Остановить пул процессов и освободить общую память дерева.
+
+    Args:
+        executor (ProcessPoolExecutor): пул процессов.
+        shared_memory (SharedMemory): блок общей памяти с массивами дерева.
+    """
+    executor.shutdown()
+    shared_memory.close()
+    shared_memory.unlink()
+
+
+class ParallelSearch:
+    """
+    Параллельный поиск ближайших соседей в пуле процессов.
+    Массивы дерева размещаются в общей памяти один раз, процессы подключаются к ней при запуске,
+    а на каждый запрос передаются только точки-запросы.
+    Пул и общая память освобождаются методом close(), а если он не был вызван - при удалении объекта.
+    """
+
+    def __init__(self, kd_tree: KDTree, workers: int):
+        """
+        Запустить пул процессов.
+
+        Args:
+            kd_tree (KDTree): построенное дерево.
+            workers (int): число процессов.
+        """
+        if workers < 1:
+            raise ValueError(f"Workers count {workers} have to be >= 1")
+        self._workers = workers
+        self._shared_memory, descriptor = kd_tree.share()
+        self._executor = ProcessPoolExecutor(max_workers=workers, initializer=_attach, initargs=(descriptor,))
+        self._finalizer = weakref.finalize(self, _release, self._executor, self._shared_memory)
+
+    @property
+    def workers(self) -> int:
+        return self._workers
+
+    def query(self, points: np.ndarray, k: int = 1, max_distance: float = np.inf,
+              hint: Optional[np.ndarray] = None, stats: Optional[dict] = None, eps: float = 0.0,
+              max_leaves: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти k ближайших соседей для набора точек, разбив его на части по числу процессов.
+
+        Args:
+            points (np.ndarray): массив точек-запросов размера (M, dimension).
+            k (int): число соседей.
+            max_distance (float): радиус поиска.
+            hint (Optional[np.ndarray]): индексы точек-кандидатов, как в KDTree.query.
+            stats (Optional[dict]): счетчики обхода, к которым прибавляются суммы по всем процессам.
+            eps (float): допустимая относительная ошибка, как в KDTree.query.
+            max_leaves (Optional[int]): максимальное число просмотренных листьев на запрос, как в KDTree.query.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (расстояния, индексы), как в KDTree.query.
+        """
+        chunks = np.array_split(np.asarray(points, dtype=np.float64), self._workers)
+        hints = np.array_split(hint, self._workers) if hint is not None else [None] * len(chunks)
+        # Точек меньше, чем процессов: пустые части не отправляются, одна остается для формы результата
+        parts = [i for i, chunk in enumerate(chunks) if len(chunk)] or [0]
+        chunks, hints = [chunks[i] for i in parts], [hints[i] for i in parts]
+        results = list(self._executor.map(_query, chunks, [k] * len(chunks), [max_distance] * len(chunks), hints,
+                                          [stats is not None] * len(chunks), [eps] * len(chunks),
+                                          [max_leaves] * len(chunks)))
+        if stats is not None:
+            for _, _, chunk_stats in results:
+                for key, value in chunk_stats.items():
+                    stats[key] += value
+        return np.concatenate([r[0] for r in results]), np.concatenate([r[1] for r in results])
+
+    def close(self):
+        """
+        Остановить пул процессов и освободить общую память. Повторный вызов ничего не делает.
+        """
+        self._finalizer()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
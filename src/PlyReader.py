@@ -0,0 +1,193 @@
+import itertools
+import numpy as np
+from typing import List, Sequence, Tuple
+from PointCloud import PointCloud
+
+
+class PlyReader:
+    """
+    Чтение вершин из ply файла напрямую в numpy-массив.
+
+    Заголовок разбирается самостоятельно. Бинарные вершины читаются через np.memmap со структурным dtype,
+    ascii вершины - блоками строк.
+    """
+
+    _TYPES = {
+        'char': 'i1', 'int8': 'i1', 'uchar': 'u1', 'uint8': 'u1',
+        'short': 'i2', 'int16': 'i2', 'ushort': 'u2', 'uint16': 'u2',
+        'int': 'i4', 'int32': 'i4', 'uint': 'u4', 'uint32': 'u4',
+        'float': 'f4', 'float32': 'f4', 'double': 'f8', 'float64': 'f8',
+    }
+    _BYTE_ORDERS = {'ascii': '=', 'binary_little_endian': '<', 'binary_big_endian': '>'}
+
+    def __init__(self, file_path: str):
+        """
+        Открыть ply файл и разобрать заголовок.
+
+        Args:
+            file_path (str): путь к файлу.
+
+        Raises:
+            ValueError: если заголовок некорректен.
+        """
+
+        """
+        _format - формат данных (ascii, binary_little_endian, binary_big_endian).
+        _elements - список элементов: (имя, количество, свойства).
+            Свойство - (имя, тип) или (имя, тип длины списка, тип элемента списка).
+        _header_size - размер заголовка в байтах.
+        """
+        self._file_path = file_path
+        self._format = None
+        self._elements: List[Tuple[str, int, List[Tuple[str, ...]]]] = []
+
+        with open(file_path, 'rb') as file:
+            if file.readline().strip() != b'ply':
+                raise ValueError(f"{file_path} is not a ply file")
+            for line in file:
+                words = line.decode('ascii').split()
+                if not words or words[0] in ('comment', 'obj_info'):
+                    continue
+                if words[0] == 'end_header':
+                    break
+                if words[0] == 'format':
+                    if words[1] not in self._BYTE_ORDERS:
+                        raise ValueError(f"Unknown ply format {words[1]}")
+                    self._format = words[1]
+                elif words[0] == 'element':
+                    self._elements.append((words[1], int(words[2]), []))
+                elif words[0] == 'property':
+                    if not self._elements:
+                        raise ValueError("Property is declared before any element")
+                    if words[1] == 'list':
+                        self._elements[-1][2].append((words[4], words[2], words[3]))
+                    else:
+                        self._elements[-1][2].append((words[2], words[1]))
+            else:
+                raise ValueError(f"{file_path} has no end_header")
+            self._header_size = file.tell()
+
+        if self._format is None:
+            raise ValueError(f"{file_path} has no format")
+
+    @property
+    def format(self) -> str:
+        return self._format
+
+    @property
+    def vertex_count(self) -> int:
+        return self._element('vertex')[1]
+
+    @property
+    def vertex_properties(self) -> List[str]:
+        return [prop[0] for prop in self._element('vertex')[2]]
+
+    def _element(self, name: str) -> Tuple[str, int, List[Tuple[str, ...]]]:
+        """
+        Найти элемент по имени.
+
+        Args:
+            name (str): имя элемента.
+
+        Raises:
+            ValueError: если элемента нет.
+
+        Returns:
+            Tuple[str, int, List[Tuple[str, ...]]]: элемент.
+        """
+        for element in self._elements:
+            if element[0] == name:
+                return element
+        raise ValueError(f"{self._file_path} has no element {name}")
+
+    def _dtype(self, properties: List[Tuple[str, ...]]) -> np.dtype:
+        """
+        Структурный dtype элемента с фиксированным размером.
+
+        Args:
+            properties (List[Tuple[str, ...]]): свойства элемента.
+
+        Raises:
+            ValueError: если элемент содержит списки.
+
+        Returns:
+            np.dtype: dtype одной записи.
+        """
+        if any(len(prop) != 2 for prop in properties):
+            raise ValueError("Elements with list properties have no fixed size")
+        byte_order = self._BYTE_ORDERS[self._format]
+        return np.dtype([(name, byte_order + self._TYPES[kind]) for name, kind in properties])
+
+    def read(self, fields: Sequence[str] = ('x', 'y', 'z'), chunk_size: int = 65536,
+             dtype: np.dtype = np.float64) -> np.ndarray:
+        """
+        Прочитать свойства вершин в массив. Остальные свойства вершин не разбираются.
+
+        Args:
+            fields (Sequence[str]): имена читаемых свойств вершин.
+            chunk_size (int): число строк в одном блоке при чтении ascii файла.
+            dtype (np.dtype): тип результата, значения приводятся к нему по блокам без промежуточной копии всего файла.
+
+        Raises:
+            ValueError: если свойства нет или данные повреждены.
+
+        Returns:
+            np.ndarray: массив размера (vertex_count, len(fields)) типа dtype.
+        """
+        vertex = self._element('vertex')
+        columns = [self.vertex_properties.index(field) if field in self.vertex_properties else None
+                   for field in fields]
+        if None in columns:
+            raise ValueError(f"Vertex has no property {fields[columns.index(None)]}")
+        result = np.empty((vertex[1], len(fields)), dtype=dtype)
+
+        preceding = self._elements[:self._elements.index(vertex)]
+        if self._format == 'ascii':
+            self._read_ascii(result, columns, len(vertex[2]), sum(element[1] for element in preceding), chunk_size)
+        else:
+            offset = self._header_size + sum(element[1] * self._dtype(element[2]).itemsize for element in preceding)
+            data = np.memmap(self._file_path, dtype=self._dtype(vertex[2]), mode='r', offset=offset,
+                             shape=(vertex[1],))
+            for i, field in enumerate(fields):
+                result[:, i] = data[field]
+            del data
+        return result
+
+    def _read_ascii(self, result: np.ndarray, columns: List[int], properties_count: int, skip_lines: int,
+                    chunk_size: int):
+        """
+        Прочитать ascii вершины блоками строк.
+
+        Args:
+            result (np.ndarray): заполняемый массив.
+            columns (List[int]): номера читаемых свойств в строке вершины.
+            properties_count (int): число свойств вершины.
+            skip_lines (int): число строк элементов перед вершинами.
+            chunk_size (int): число строк в блоке.
+
+        Raises:
+            ValueError: если файл закончился раньше или строки содержат неверное число значений.
+        """
+        with open(self._file_path, 'rb') as file:
+            file.seek(self._header_size)
+            for _ in itertools.islice(file, skip_lines):
+                pass
+            for start in range(0, len(result), chunk_size):
+                count = min(chunk_size, len(result) - start)
+                lines = list(itertools.islice(file, count))
+                values = np.array(b' '.join(lines).split(), dtype=np.float64)
+                if len(lines) != count or values.size != count * properties_count:
+                    raise ValueError(f"Corrupted vertex data in {self._file_path}")
+                result[start:start + count] = values.reshape(count, properties_count)[:, columns]
+
+    def read_cloud(self, dtype: np.dtype = np.float64) -> PointCloud:
+        """
+        Прочитать вершины как облако точек.
+
+        Args:
+            dtype (np.dtype): тип хранения координат облака, float32 или float64.
+
+        Returns:
+            PointCloud: облако точек.
+        """
+        return PointCloud(self.read(('x', 'y', 'z'), dtype=dtype), dtype)
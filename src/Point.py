@@ -4,6 +4,8 @@ from abc import ABC
 
 
 class Point(ABC):
+    __slots__ = ('_coordinates',)
+
     def __init__(self, coordinates: Optional[List[float]] = None):
         self._coordinates = coordinates
 
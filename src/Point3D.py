@@ -1,18 +1,40 @@
 import numpy as np
-from mpl_toolkits.mplot3d import Axes3D
+from typing import TYPE_CHECKING
 
 from Point import Point
 from Drawable import Drawable
 
+if TYPE_CHECKING:
+    from mpl_toolkits.mplot3d import Axes3D
+
 
 class Point3D(Point, Drawable):
     """
     Точка в трехмерном пространстве.
+    Экземпляры не имеют __dict__: все состояние - список координат в слоте _coordinates.
     """
 
+    __slots__ = ()
+
     def __init__(self, x: float = 0.0, y: float = 0.0, z: float = 0.0):
         super().__init__([x, y, z])
 
+    @classmethod
+    def from_array(cls, coordinates: np.ndarray) -> 'Point3D':
+        """
+        Создать точку-представление над строкой массива без копирования координат.
+        Изменение точки (например, поворот) изменяет исходный массив.
+
+        Args:
+            coordinates (np.ndarray): массив из трех координат.
+
+        Returns:
+            Point3D: точка, разделяющая память с массивом.
+        """
+        point = cls.__new__(cls)
+        point._coordinates = coordinates
+        return point
+
     @classmethod
     def dimension(cls):
         return 3
@@ -54,7 +76,7 @@ class Point3D(Point, Drawable):
         self._coordinates[0], self._coordinates[1], self._coordinates[2] = result.item(0), result.item(1), result.item(
             2)
 
-    def draw(self, ax: Axes3D, color: str, size: float = 0.1):
+    def draw(self, ax: 'Axes3D', color: str, size: float = 0.1):
         """
         Отрисовать объект в matplotlib.
 
@@ -1,22 +1,109 @@
 import numpy as np
-from typing import List, Callable
-from mpl_toolkits.mplot3d import Axes3D
+from typing import TYPE_CHECKING, Iterable, Callable, Optional
 from Point3D import Point3D
 from Drawable import Drawable
-from src.Point import PointContainer
+from Point import PointContainer
+from KDTree import KDTree
+from SpatialIndex import SpatialIndex
+
+if TYPE_CHECKING:
+    from mpl_toolkits.mplot3d import Axes3D
 
 
 class PointCloud(PointContainer, Drawable):
     """
     Облако точек в трехмерном пространстве.
+
+    Точки хранятся в одном непрерывном массиве размера (N, 3) типа float64 или float32.
+    float32 вдвое уменьшает память под большие облака, средние и суммы при этом считаются в float64.
+    Итерация и доступ по индексу возвращают Point3D-представления строк массива без копирования.
     """
 
-    def __init__(self, points: List[Point3D]):
-        super().__init__(points)
+    DTYPES = (np.dtype(np.float32), np.dtype(np.float64))
+
+    def __init__(self, points: Iterable[Point3D] | np.ndarray, dtype: Optional[np.dtype] = None):
+        """
+        Инициализировать облако точек.
+
+        Args:
+            points (Iterable[Point3D] | np.ndarray): точки или массив координат размера (N, 3).
+            dtype (Optional[np.dtype]): тип хранения координат, float32 или float64. Если None, то массив float32
+                сохраняется как есть, остальное приводится к float64.
+
+        Raises:
+            ValueError: если dtype не float32 и не float64.
+        """
+        if isinstance(points, PointCloud):
+            points = points.points
+        elif not isinstance(points, np.ndarray):
+            points = [list(p) for p in points]
+        if dtype is None:
+            dtype = np.float32 if isinstance(points, np.ndarray) and points.dtype == np.float32 else np.float64
+        elif np.dtype(dtype) not in self.DTYPES:
+            raise ValueError(f"Dtype {np.dtype(dtype)} have to be float32 or float64")
+        super().__init__(np.asarray(points, dtype=dtype).reshape(-1, Point3D.dimension()))
+        self._normals: Optional[np.ndarray] = None
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        Массив координат точек размера (N, 3), без копирования.
+
+        Returns:
+            np.ndarray: массив точек.
+        """
+        return self._points
+
+    @property
+    def dtype(self) -> np.dtype:
+        return self._points.dtype
+
+    @property
+    def normals(self) -> Optional[np.ndarray]:
+        """
+        Нормали точек, посчитанные estimate_normals.
+
+        Returns:
+            Optional[np.ndarray]: массив единичных нормалей размера (N, 3) или None, если нормали не считались.
+        """
+        return self._normals
+
+    def estimate_normals(self, kd_tree: Optional[SpatialIndex] = None, k: int = 10,
+                         chunk_size: int = 65536) -> np.ndarray:
+        """
+        Оценить нормали методом главных компонент по k ближайшим соседям каждой точки.
+        Нормаль - собственный вектор ковариационной матрицы соседей с наименьшим собственным числом.
+        Ковариация считается в float64, результат сохраняется в normals с типом точек облака.
+
+        Args:
+            kd_tree (Optional[SpatialIndex]): дерево или другая структура поиска соседей, построенная по этому облаку;
+                если None, то строится KDTree.
+            k (int): число соседей.
+            chunk_size (int): число точек, обрабатываемых за один векторный проход.
+
+        Returns:
+            np.ndarray: массив единичных нормалей размера (N, 3).
+        """
+        if kd_tree is None:
+            kd_tree = KDTree(PointCloud)
+            kd_tree.build(self)
+
+        normals = np.empty_like(self._points)
+        for start in range(0, len(self._points), chunk_size):
+            _, indices = kd_tree.query(self._points[start:start + chunk_size], min(k, len(self._points)))
+            neighbours = kd_tree.points[indices.reshape(len(indices), -1)].astype(np.float64, copy=False)
+            neighbours = neighbours - neighbours.mean(axis=1, keepdims=True)
+            covariance = np.einsum('nki,nkj->nij', neighbours, neighbours)
+            _, vectors = np.linalg.eigh(covariance)
+            normals[start:start + chunk_size] = vectors[:, :, 0]
+        self._normals = normals
+        return normals
 
     @property
     def mass_center(self) -> Point3D:
-        return sum(self._points, Point3D()) / len(self._points)
+        if len(self._points) == 0:
+            raise Exception("Division by zero")
+        return Point3D(*self._points.mean(axis=0, dtype=np.float64))
 
     @property
     def length(self) -> int:
@@ -33,7 +120,10 @@ class PointCloud(PointContainer, Drawable):
         Args:
             key (Callable): метод сравнения точек.
         """
-        self._points = sorted(self._points, key=key)
+        order = sorted(range(len(self._points)), key=lambda i: key(self[i]))
+        self._points = self._points[order]
+        if self._normals is not None:
+            self._normals = self._normals[order]
 
     def get_matrix(self, by_rows: bool = True) -> np.array:
         """
@@ -45,20 +135,107 @@ class PointCloud(PointContainer, Drawable):
         Returns:
             np.array: матрица точек.
         """
-        matrix = np.array([[p.x, p.y, p.z] for p in self])
+        matrix = self._points.copy()
         return matrix if by_rows else matrix.T
 
+    def translate(self, vector: Point3D | np.ndarray):
+        """
+        Сдвинуть все точки на вектор.
+
+        Args:
+            vector (Point3D | np.ndarray): вектор сдвига.
+        """
+        self._points += np.asarray(list(vector), dtype=np.float64)
+
     def rotate(self, rotation_matrix: np.array):
         """
-        Повернуть объект.
+        Повернуть объект. Посчитанные нормали поворачиваются вместе с точками.
 
         Args:
             rotation_matrix (np.array): матрица поворота.
         """
-        for p in self._points:
-            p.rotate(rotation_matrix)
+        self._points[:] = self._points @ np.asarray(rotation_matrix).T
+        if self._normals is not None:
+            self._normals[:] = self._normals @ np.asarray(rotation_matrix).T
+
+    def scale(self, factor: int | float):
+        """
+        Масштабировать все точки относительно начала координат.
+
+        Args:
+            factor (int | float): коэффициент масштабирования.
+        """
+        self._points *= factor
+
+    def voxel_downsample(self, voxel_size: float) -> 'PointCloud':
+        """
+        Прореживание по воксельной сетке: точки каждого непустого вокселя заменяются их средним.
+
+        Args:
+            voxel_size (float): размер ребра вокселя.
+
+        Raises:
+            ValueError: если размер вокселя не положителен.
+
+        Returns:
+            PointCloud: прореженное облако точек.
+        """
+        if voxel_size <= 0:
+            raise ValueError(f"Voxel size {voxel_size} have to be > 0")
+        if not len(self._points):
+            return PointCloud(self._points.copy())
+
+        voxels = np.floor((self._points - self._points.min(axis=0)) / voxel_size).astype(np.int64)
+        shape = voxels.max(axis=0) + 1
+        if np.prod(shape.astype(np.float64)) < 2 ** 62:
+            keys = np.ravel_multi_index(voxels.T, shape)
+            _, inverse, counts = np.unique(keys, return_inverse=True, return_counts=True)
+        else:
+            _, inverse, counts = np.unique(voxels, axis=0, return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+
+        sums = np.stack([np.bincount(inverse, weights=self._points[:, i], minlength=len(counts))
+                         for i in range(self._points.shape[1])], axis=1)
+        return PointCloud(sums / counts[:, None], self.dtype)
+
+    def random_downsample(self, ratio: float, seed: Optional[int] = None) -> 'PointCloud':
+        """
+        Случайное прореживание без повторений.
+
+        Args:
+            ratio (float): доля оставляемых точек из (0, 1].
+            seed (Optional[int]): зерно генератора случайных чисел.
+
+        Raises:
+            ValueError: если доля вне (0, 1].
+
+        Returns:
+            PointCloud: прореженное облако точек.
+        """
+        if not 0 < ratio <= 1:
+            raise ValueError(f"Ratio {ratio} have to be in (0, 1]")
+        count = int(round(ratio * len(self._points)))
+        indices = np.random.default_rng(seed).choice(len(self._points), size=count, replace=False)
+        return PointCloud(self._points[np.sort(indices)])
+
+    def uniform_downsample(self, every_k: int) -> 'PointCloud':
+        """
+        Равномерное прореживание: оставить каждую every_k-ю точку.
+
+        Args:
+            every_k (int): шаг прореживания.
+
+        Raises:
+            ValueError: если шаг меньше 1.
+
+        Returns:
+            PointCloud: прореженное облако точек.
+        """
+        if every_k < 1:
+            raise ValueError(f"Step {every_k} have to be >= 1")
+        return PointCloud(self._points[::every_k].copy())
 
-    def draw(self, ax: Axes3D, color: str):
+    def draw(self, ax: 'Axes3D', color: str):
         """
         Отрисовать объект в matplotlib.
 
@@ -66,41 +243,42 @@ class PointCloud(PointContainer, Drawable):
             ax (Axes3D): оси matplotlib.
             color (str): цвет объекта.
         """
-        points_array = self.get_matrix().T
-        ax.scatter3D(*points_array, color=color)
+        ax.scatter3D(*self._points.T, color=color)
 
     def __mul__(self, other: int | float):
         if type(other) not in [int, float]:
             raise Exception(f"other type {type(other)} is not {int} or {float}")
-        return PointCloud([point * other for point in self._points])
+        return PointCloud(self._points * other)
 
     def __rmul__(self, other: int | float):
         if type(other) not in [int, float]:
             raise Exception(f"other type {type(other)} is not {int} or {float}")
-        return PointCloud([point * other for point in self._points])
+        return PointCloud(self._points * other)
 
     def __add__(self, other: Point3D):
         if type(other) is not Point3D:
             raise Exception(f"other type {type(other)} is not {Point3D}")
-        return PointCloud([point + other for point in self._points])
+        return PointCloud(self._points + np.array(list(other)), self.dtype)
 
     def __sub__(self, other: Point3D):
         if type(other) is not Point3D:
             raise Exception(f"other type {type(other)} is not {Point3D}")
-        return PointCloud([point - other for point in self._points])
+        return PointCloud(self._points - np.array(list(other)), self.dtype)
 
     def __iter__(self):
         for each in self._points:
-            yield each
+            yield Point3D.from_array(each)
 
     def __getitem__(self, item):
-        return self._points[item]
+        if isinstance(item, (int, np.integer)):
+            return Point3D.from_array(self._points[item])
+        return PointCloud(self._points[item])
 
     def __len__(self):
         return len(self._points)
 
     def __str__(self):
-        return "[" + ", ".join(str(point) for point in self._points) + "]"
+        return "[" + ", ".join(str(point) for point in self) + "]"
 
     def __repr__(self):
-        return "[" + ", ".join(point.__repr__() for point in self._points) + "]"
+        return "[" + ", ".join(point.__repr__() for point in self) + "]"
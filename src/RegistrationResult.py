@@ -0,0 +1,90 @@
+from enum import Enum
+from typing import Optional
+import numpy as np
+from PointCloud import PointCloud
+
+
+class StopReason(Enum):
+    """
+    Причина остановки алгоритма.
+    """
+    PENALTY_BOUND = 'penalty_bound'
+    TRANSFORM_DELTA = 'transform_delta'
+    RELATIVE_CHANGE = 'relative_change'
+    TIME_BUDGET = 'time_budget'
+    NO_CORRESPONDENCES = 'no_correspondences'
+    MAX_ITER = 'max_iter'
+
+
+class RegistrationResult:
+    """
+    Результат совмещения облаков точек: итоговое жесткое преобразование в однородных координатах.
+    """
+
+    def __init__(self, transformation: np.ndarray, penalty: Optional[float], iterations: int,
+                 stop_reason: Optional[StopReason] = None, elapsed: float = 0.0):
+        """
+        Инициализировать результат.
+
+        Args:
+            transformation (np.ndarray): матрица преобразования 4x4, переводящая исходный source к target.
+            penalty (Optional[float]): значение штрафной функции при последнем поиске соседей.
+            iterations (int): число выполненных шагов алгоритма.
+            stop_reason (Optional[StopReason]): причина остановки, None если алгоритм не запускался.
+            elapsed (float): время работы алгоритма в секундах.
+        """
+        self._transformation = np.array(transformation, dtype=np.float64)
+        self._penalty = penalty
+        self._iterations = iterations
+        self._stop_reason = stop_reason
+        self._elapsed = elapsed
+
+    @property
+    def transformation(self) -> np.ndarray:
+        return self._transformation
+
+    @property
+    def rotation(self) -> np.ndarray:
+        return self._transformation[:3, :3]
+
+    @property
+    def translation(self) -> np.ndarray:
+        return self._transformation[:3, 3]
+
+    @property
+    def penalty(self) -> Optional[float]:
+        return self._penalty
+
+    @property
+    def rmse(self) -> Optional[float]:
+        return None if self._penalty is None else float(np.sqrt(self._penalty))
+
+    @property
+    def iterations(self) -> int:
+        return self._iterations
+
+    @property
+    def stop_reason(self) -> Optional[StopReason]:
+        return self._stop_reason
+
+    @property
+    def elapsed(self) -> float:
+        return self._elapsed
+
+    def apply(self, cloud: PointCloud) -> PointCloud:
+        """
+        Применить преобразование к облаку точек, например к скану полного разрешения
+        после совмещения прореженного.
+
+        Args:
+            cloud (PointCloud): облако точек.
+
+        Returns:
+            PointCloud: новое преобразованное облако точек.
+        """
+        return PointCloud(cloud.points @ self.rotation.T + self.translation)
+
+    def __repr__(self):
+        reason = None if self._stop_reason is None else self._stop_reason.value
+        return (f"RegistrationResult(penalty={self._penalty}, iterations={self._iterations}, stop_reason={reason}, "
+                f"elapsed={self._elapsed:.3f})")
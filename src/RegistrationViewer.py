@@ -0,0 +1,143 @@
+import queue
+import threading
+from typing import Optional
+import numpy as np
+from matplotlib import pyplot as plt
+from PointCloud import PointCloud
+from RegistrationResult import RegistrationResult
+
+
+class RegistrationViewer:
+    """
+    Отрисовка хода совмещения облаков точек, не блокирующая алгоритм.
+
+    Алгоритм работает в отдельном потоке и публикует состояние после каждой итерации через publish,
+    который не ждет отрисовки: хранится только последнее состояние, промежуточные отбрасываются.
+    Главный поток перерисовывает прореженную копию source не чаще одного раза за interval секунд.
+    """
+
+    def __init__(self, source: PointCloud, target: PointCloud, max_points: int = 2000, interval: float = 0.05,
+                 seed: Optional[int] = 0):
+        """
+        Инициализировать отрисовку.
+
+        Args:
+            source (PointCloud): исходное облако точек, которое совмещается.
+            target (PointCloud): облако точек, с которым совмещается source.
+            max_points (int): максимальное число отрисовываемых точек каждого облака.
+            interval (float): пауза между перерисовками в секундах.
+            seed (Optional[int]): зерно генератора случайных чисел для прореживания.
+
+        Raises:
+            ValueError: если max_points или interval не положительны.
+        """
+        if max_points < 1:
+            raise ValueError(f"Max points {max_points} have to be >= 1")
+        if interval <= 0:
+            raise ValueError(f"Interval {interval} have to be > 0")
+        rng = np.random.default_rng(seed)
+        self._source = self._subsample(source.points, max_points, rng)
+        self._target = self._subsample(target.points, max_points, rng)
+        self._interval = interval
+        self._states: queue.Queue = queue.Queue(maxsize=1)
+
+    @staticmethod
+    def _subsample(points: np.ndarray, max_points: int, rng: np.random.Generator) -> np.ndarray:
+        """
+        Случайная выборка не более max_points точек.
+
+        Args:
+            points (np.ndarray): массив точек размера (N, 3).
+            max_points (int): максимальное число точек.
+            rng (np.random.Generator): генератор случайных чисел.
+
+        Returns:
+            np.ndarray: копия выбранных точек.
+        """
+        if len(points) <= max_points:
+            return points.copy()
+        return points[np.sort(rng.choice(len(points), size=max_points, replace=False))]
+
+    def publish(self, result: RegistrationResult):
+        """
+        Передать состояние алгоритма на отрисовку без ожидания.
+        Если предыдущее состояние еще не отрисовано, оно заменяется.
+
+        Args:
+            result (RegistrationResult): состояние после итерации.
+        """
+        while True:
+            try:
+                self._states.put_nowait(result)
+                return
+            except queue.Full:
+                try:
+                    self._states.get_nowait()
+                except queue.Empty:
+                    pass
+
+    def run(self, icp, pyramid: Optional[list] = None, **kwargs) -> RegistrationResult:
+        """
+        Запустить алгоритм в отдельном потоке и отрисовывать его ход, пока он не завершится.
+        Должен вызываться из главного потока.
+
+        Args:
+            icp (ICP): алгоритм, построенный по тем же source и target.
+            pyramid (Optional[list]): размеры вокселей для icp_pyramid, если None, то запускается icp_algorithm.
+            **kwargs: параметры icp_algorithm или icp_pyramid.
+
+        Raises:
+            Exception: исключение, возникшее в алгоритме.
+
+        Returns:
+            RegistrationResult: итоговый результат алгоритма.
+        """
+        outcome = {}
+
+        def solve():
+            try:
+                if pyramid is None:
+                    outcome['result'] = icp.icp_algorithm(on_iteration=self.publish, **kwargs)
+                else:
+                    outcome['result'] = icp.icp_pyramid(pyramid, on_iteration=self.publish, **kwargs)
+            except Exception as error:
+                outcome['error'] = error
+
+        fig = plt.figure()
+        ax = fig.add_subplot(projection='3d')
+        ax.scatter3D(*self._target.T, color='red', s=1)
+        scatter = ax.scatter3D(*self._source.T, color='blue', s=1)
+        title = ax.set_title("iteration 0")
+
+        solver = threading.Thread(target=solve, daemon=True)
+        solver.start()
+        while solver.is_alive() or not self._states.empty():
+            try:
+                state = self._states.get_nowait()
+            except queue.Empty:
+                state = None
+            if state is not None:
+                self._draw(scatter, title, state)
+            plt.pause(self._interval)
+        solver.join()
+
+        if 'error' in outcome:
+            raise outcome['error']
+        self._draw(scatter, title, outcome['result'])
+        fig.canvas.draw_idle()
+        return outcome['result']
+
+    def _draw(self, scatter, title, state: RegistrationResult):
+        """
+        Обновить положение source на графике.
+
+        Args:
+            scatter: точки source на графике.
+            title: заголовок графика.
+            state (RegistrationResult): отрисовываемое состояние.
+        """
+        points = self._source @ state.rotation.T + state.translation
+        scatter._offsets3d = tuple(points.T)
+        # rmse нет, если поиск соседей не запускался, например бюджет времени исчерпан до первой итерации
+        rmse = "-" if state.rmse is None else f"{state.rmse:.6f}"
+        title.set_text(f"iteration {state.iterations}, rmse {rmse}")
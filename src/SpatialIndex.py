@@ -0,0 +1,178 @@
+from abc import ABC, abstractmethod
+from typing import Optional, Tuple
+import numpy as np
+
+
+class SpatialIndex(ABC):
+    """
+    Структура для поиска ближайших соседей среди точек target.
+    """
+
+    STATS_KEYS: Tuple[str, ...] = ()
+
+    @property
+    @abstractmethod
+    def points(self) -> np.ndarray:
+        """
+        Точки, по которым построена структура, в исходном порядке.
+
+        Returns:
+            np.ndarray: массив точек размера (N, dimension).
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def build(self, point_collection):
+        """
+        Построить структуру по коллекции точек.
+
+        Args:
+            point_collection: коллекция точек.
+        """
+        raise NotImplementedError
+
+    @abstractmethod
+    def query(self, points: np.ndarray, k: int = 1, max_distance: float = np.inf,
+              hint: Optional[np.ndarray] = None, stats: Optional[dict] = None,
+              eps: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти k ближайших соседей сразу для набора точек.
+
+        Args:
+            points (np.ndarray): массив точек-запросов размера (M, dimension).
+            k (int): число соседей.
+            max_distance (float): радиус поиска, соседи на расстоянии max_distance и дальше не возвращаются.
+            hint (Optional[np.ndarray]): индексы точек-кандидатов размера (M,), например соседи с прошлой итерации ICP.
+                При eps = 0 результат от них не зависит.
+            stats (Optional[dict]): счетчики поиска, к которым прибавляются значения STATS_KEYS.
+            eps (float): допустимая относительная ошибка: i-й найденный сосед дальше истинного i-го соседа
+                не больше чем в (1 + eps) раз. 0 - точный поиск.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (расстояния, индексы точек в self.points).
+            При k == 1 массивы имеют размер (M,), иначе (M, k).
+            Недостающие соседи имеют расстояние inf и индекс len(self.points).
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def _check_query(points: np.ndarray, k: int, eps: float, dimension: int) -> np.ndarray:
+        """
+        Проверить параметры запроса.
+
+        Args:
+            points (np.ndarray): массив точек-запросов.
+            k (int): число соседей.
+            eps (float): допустимая относительная ошибка.
+            dimension (int): размерность точек структуры.
+
+        Raises:
+            ValueError: если k < 1, eps < 0 или точки не имеют размер (M, dimension).
+
+        Returns:
+            np.ndarray: точки-запросы типа float64.
+        """
+        if k < 1:
+            raise ValueError(f"k = {k} have to be >= 1")
+        if eps < 0:
+            raise ValueError(f"eps = {eps} have to be >= 0")
+        points = np.asarray(points, dtype=np.float64)
+        if points.ndim != 2 or points.shape[1] != dimension:
+            raise ValueError(f"Points have to be an array of shape (M, {dimension})")
+        return points
+
+    @staticmethod
+    def _check_hint(hint: np.ndarray, k: int, count: int) -> np.ndarray:
+        """
+        Проверить индексы точек-кандидатов.
+
+        Args:
+            hint (np.ndarray): индексы точек-кандидатов.
+            k (int): число соседей.
+            count (int): число запросов.
+
+        Raises:
+            ValueError: если k != 1.
+
+        Returns:
+            np.ndarray: индексы типа int64 размера (count,).
+        """
+        if k != 1:
+            raise ValueError("Hint is supported only for k = 1")
+        return np.asarray(hint, dtype=np.int64).reshape(count)
+
+    def _start_query(self, points: np.ndarray, k: int, max_distance: float,
+                     hint: Optional[np.ndarray]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Создать списки k ближайших соседей до поиска: пустые списки ограничены радиусом поиска,
+        а точки-кандидаты из hint сразу становятся соседями, если они ближе радиуса.
+
+        Args:
+            points (np.ndarray): проверенные точки-запросы размера (M, dimension).
+            k (int): число соседей.
+            max_distance (float): радиус поиска.
+            hint (Optional[np.ndarray]): индексы точек-кандидатов, индексы вне [0, len(self.points)) игнорируются.
+
+        Raises:
+            ValueError: если hint задан при k > 1.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (квадраты расстояний, индексы) размера (M, k).
+            Пустые места имеют квадрат max_distance и индекс len(self.points).
+        """
+        target = self.points
+        best_dist = np.full((len(points), k), np.square(max_distance, dtype=np.float64))
+        best_index = np.full((len(points), k), len(target), dtype=np.int64)
+        if hint is not None:
+            hint = self._check_hint(hint, k, len(points))
+            queries = np.flatnonzero((hint >= 0) & (hint < len(target)))
+            dist = np.sum(np.square(points[queries] - target[hint[queries]]), axis=1)
+            self._push_candidates(best_dist, best_index, queries, dist[:, None], hint[queries, None])
+        return best_dist, best_index
+
+    def _finish_query(self, best_dist: np.ndarray, best_index: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Привести списки соседей к результату query.
+
+        Args:
+            best_dist (np.ndarray): квадраты расстояний до соседей (M, k).
+            best_index (np.ndarray): индексы соседей (M, k).
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (расстояния, индексы) как в query.
+        """
+        best_dist = np.sqrt(best_dist)
+        best_dist[best_index == len(self.points)] = np.inf
+        if best_dist.shape[1] == 1:
+            return best_dist[:, 0], best_index[:, 0]
+        return best_dist, best_index
+
+    @staticmethod
+    def _push_candidates(best_dist: np.ndarray, best_index: np.ndarray, queries: np.ndarray,
+                         dist: np.ndarray, indices: np.ndarray):
+        """
+        Обновить списки k ближайших соседей кандидатами. При равных расстояниях остаются текущие соседи.
+
+        Args:
+            best_dist (np.ndarray): отсортированные квадраты расстояний до текущих соседей (M, k), обновляется.
+            best_index (np.ndarray): индексы текущих соседей (M, k), обновляется.
+            queries (np.ndarray): индексы запросов, для которых проверяются кандидаты.
+            dist (np.ndarray): квадраты расстояний от запросов до кандидатов (len(queries), C).
+            indices (np.ndarray): индексы кандидатов размера (C,) или (len(queries), C).
+        """
+        k = best_dist.shape[1]
+        indices = np.broadcast_to(indices, dist.shape)
+        if k == 1:
+            closest = np.argmin(dist, axis=1)
+            rows = np.arange(len(queries))
+            dist, indices = dist[rows, closest], indices[rows, closest]
+            better = dist < best_dist[queries, 0]
+            best_dist[queries[better], 0] = dist[better]
+            best_index[queries[better], 0] = indices[better]
+            return
+
+        all_dist = np.concatenate((best_dist[queries], dist), axis=1)
+        all_index = np.concatenate((best_index[queries], indices), axis=1)
+        order = np.argsort(all_dist, axis=1, kind='stable')[:, :k]
+        best_dist[queries] = np.take_along_axis(all_dist, order, axis=1)
+        best_index[queries] = np.take_along_axis(all_index, order, axis=1)
@@ -0,0 +1,352 @@
+import itertools
+import numpy as np
+from typing import Optional, Tuple
+from KDTree import KDTree
+from Point import PointContainer
+from PointCloud import PointCloud
+from SpatialIndex import SpatialIndex
+
+
+class VoxelGrid(SpatialIndex):
+    """
+    Равномерная воксельная сетка для поиска ближайших соседей.
+
+    Точки сортируются по ключу вокселя, для каждого непустого вокселя хранится диапазон [start, end)
+    в отсортированном массиве, воксель запроса находится бинарным поиском по ключам.
+    Поиск векторный: для всех запросов сразу просматривается воксель запроса, затем 26 соседних вокселей,
+    кроме тех, которые дальше уже найденного соседа.
+    Если max_distance не больше cell_size, то этого всегда достаточно. Запросы, сосед которых
+    может лежать дальше 27 вокселей, передаются в KDTree, которое строится по тем же точкам при первой необходимости.
+    """
+
+    STATS_KEYS = ('cells_visited', 'distance_evaluations', 'tree_queries')
+    _NEIGHBOURS = np.array([offset for offset in itertools.product((-1, 0, 1), repeat=3) if any(offset)],
+                           dtype=np.int64)
+
+    def __init__(self, cell_size: Optional[float] = None, points_per_cell: float = 4.0, batch_size: int = 2 ** 20):
+        """
+        Инициализировать воксельную сетку.
+
+        Args:
+            cell_size (Optional[float]): размер ребра вокселя, если None, то подбирается при построении так,
+                чтобы в непустом вокселе было в среднем около points_per_cell точек.
+            points_per_cell (float): желаемое среднее число точек в непустом вокселе при подборе cell_size.
+            batch_size (int): наибольшее число пар запрос-воксель или запрос-точка в одном векторном проходе.
+
+        Raises:
+            ValueError: если параметры не положительны.
+        """
+
+        """
+        _points - точки в исходном порядке.
+        _sorted_points - точки, отсортированные по ключу вокселя.
+        _order - индексы исходных точек в порядке _sorted_points.
+        _keys - ключи непустых вокселей по возрастанию, _start и _end - их диапазоны в _sorted_points.
+        _origin - угол сетки, _shape - число вокселей по каждой оси.
+        _tree - KDTree для запросов, не решенных по 27 вокселям, None пока не понадобилось.
+        """
+        if cell_size is not None and cell_size <= 0:
+            raise ValueError(f"Cell size {cell_size} have to be > 0")
+        if points_per_cell <= 0:
+            raise ValueError(f"Points per cell {points_per_cell} have to be > 0")
+        if batch_size < 1:
+            raise ValueError(f"Batch size {batch_size} have to be >= 1")
+        self._requested_cell_size = cell_size
+        self._points_per_cell = points_per_cell
+        self._batch_size = batch_size
+
+        self._cell_size = cell_size
+        self._points = np.empty((0, 3))
+        self._sorted_points = np.empty((0, 3))
+        self._order = np.empty(0, dtype=np.int64)
+        self._keys = np.empty(0, dtype=np.int64)
+        self._start = np.empty(0, dtype=np.int64)
+        self._end = np.empty(0, dtype=np.int64)
+        self._origin = np.zeros(3)
+        self._shape = np.ones(3, dtype=np.int64)
+        self._tree: Optional[KDTree] = None
+
+    @property
+    def points(self) -> np.ndarray:
+        """
+        Точки, по которым построена сетка, в исходном порядке.
+
+        Returns:
+            np.ndarray: массив точек размера (N, 3).
+        """
+        return self._points
+
+    @property
+    def cell_size(self) -> Optional[float]:
+        return self._cell_size
+
+    @property
+    def cell_count(self) -> int:
+        return len(self._keys)
+
+    def _estimate_cell_size(self, points: np.ndarray) -> float:
+        """
+        Подобрать размер вокселя под среднее число точек в непустом вокселе.
+        Начальный размер считается по объему boundary box, затем дважды уточняется
+        по фактической заполненности в предположении, что точки лежат на поверхности.
+
+        Args:
+            points (np.ndarray): массив точек размера (N, 3).
+
+        Returns:
+            float: размер ребра вокселя.
+        """
+        extent = points.max(axis=0) - points.min(axis=0)
+        if extent.max() == 0:
+            return 1.0
+        extent = np.maximum(extent, extent.max() * 1e-3)
+        cell_size = float(np.cbrt(np.prod(extent) * self._points_per_cell / len(points)))
+        for _ in range(2):
+            cells = np.floor((points - points.min(axis=0)) / cell_size).astype(np.int64)
+            occupied = len(np.unique(self._ravel(cells, cells.max(axis=0) + 1)))
+            cell_size *= float(np.sqrt(self._points_per_cell * occupied / len(points)))
+        return cell_size
+
+    @staticmethod
+    def _ravel(cells: np.ndarray, shape: np.ndarray) -> np.ndarray:
+        """
+        Ключи вокселей по их целочисленным координатам.
+
+        Args:
+            cells (np.ndarray): координаты вокселей размера (..., 3), внутри сетки.
+            shape (np.ndarray): число вокселей по каждой оси.
+
+        Returns:
+            np.ndarray: ключи размера (...).
+        """
+        return (cells[..., 0] * shape[1] + cells[..., 1]) * shape[2] + cells[..., 2]
+
+    def build(self, point_collection: PointContainer | np.ndarray):
+        """
+        Построить сетку по коллекции точек.
+
+        Args:
+            point_collection (PointContainer | np.ndarray): коллекция точек или массив размера (N, 3).
+
+        Raises:
+            ValueError: если воксель слишком мал для размеров облака.
+        """
+        if isinstance(point_collection, np.ndarray):
+            points = point_collection
+        elif hasattr(point_collection, 'points'):
+            points = point_collection.points
+        else:
+            points = [list(point) for point in point_collection]
+        self._points = np.array(points, dtype=np.float64).reshape(-1, 3)
+        if not len(self._points):
+            self._cell_size = self._requested_cell_size or 1.0
+            self._sorted_points = self._points
+            self._order = self._keys = self._start = self._end = np.empty(0, dtype=np.int64)
+            self._tree = None
+            return
+
+        self._cell_size = self._requested_cell_size or self._estimate_cell_size(self._points)
+        self._origin = self._points.min(axis=0)
+        extent = np.floor((self._points.max(axis=0) - self._origin) / self._cell_size) + 1
+        if np.prod(extent) >= 2 ** 62:
+            raise ValueError(f"Cell size {self._cell_size} is too small for the cloud extent")
+        self._shape = extent.astype(np.int64)
+
+        keys = self._ravel(np.floor((self._points - self._origin) / self._cell_size).astype(np.int64), self._shape)
+        self._order = np.argsort(keys, kind='stable')
+        self._sorted_points = self._points[self._order]
+        self._keys, self._start = np.unique(keys[self._order], return_index=True)
+        self._end = np.append(self._start[1:], len(self._points))
+        self._tree = None
+
+    def query(self, points: np.ndarray, k: int = 1, max_distance: float = np.inf,
+              hint: Optional[np.ndarray] = None, stats: Optional[dict] = None,
+              eps: float = 0.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Найти k ближайших соседей сразу для набора точек.
+        Запрос считается решенным, когда расстояние до k-го соседа не больше расстояния
+        от точки запроса до еще не просмотренных вокселей, умноженного на (1 + eps).
+
+        Args:
+            points (np.ndarray): массив точек-запросов размера (M, 3).
+            k (int): число соседей.
+            max_distance (float): радиус поиска.
+            hint (Optional[np.ndarray]): индексы точек-кандидатов размера (M,), например соседи с прошлой итерации ICP.
+                Расстояние до кандидата используется как начальная верхняя граница. Индексы вне [0, len(self.points))
+                игнорируются.
+            stats (Optional[dict]): счетчики поиска, к которым прибавляются значения STATS_KEYS
+                (просмотренные воксели и посчитанные расстояния считаются для пар запрос-воксель и запрос-точка,
+                tree_queries - число запросов, переданных в KDTree).
+            eps (float): допустимая относительная ошибка, 0 - точный поиск.
+
+        Raises:
+            ValueError: если k < 1, размерность точек не равна 3, hint задан при k > 1 или eps < 0.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray] - (расстояния, индексы точек в self.points).
+            При k == 1 массивы имеют размер (M,), иначе (M, k).
+            Недостающие соседи (в том числе дальше max_distance) имеют расстояние inf и индекс len(self.points).
+        """
+        points = self._check_query(points, k, eps, 3)
+        best_dist, best_index = self._start_query(points, k, max_distance, hint)
+        if len(self._points):
+            self._search(points, best_dist, best_index, max_distance, stats, eps)
+        return self._finish_query(best_dist, best_index)
+
+    def _search(self, points: np.ndarray, best_dist: np.ndarray, best_index: np.ndarray, max_distance: float,
+                stats: Optional[dict], eps: float):
+        """
+        Поиск по 27 вокселям вокруг вокселя запроса с передачей нерешенных запросов в KDTree.
+
+        Args:
+            points (np.ndarray): точки-запросы размера (M, 3).
+            best_dist (np.ndarray): квадраты расстояний до текущих соседей (M, k), обновляется.
+            best_index (np.ndarray): индексы текущих соседей (M, k), обновляется.
+            max_distance (float): радиус поиска.
+            stats (Optional[dict]): счетчики поиска.
+            eps (float): допустимая относительная ошибка.
+        """
+        scale = (1 + eps) ** 2
+        position = (points - self._origin) / self._cell_size
+        # Запросы, до boundary box которых дальше текущего k-го соседа, уже решены
+        outside = np.maximum(np.maximum(-position, position - self._shape), 0) * self._cell_size
+        active = np.flatnonzero(np.sum(np.square(outside), axis=1) * scale < best_dist[:, -1])
+        # Соседние воксели запросов дальше одного вокселя от сетки пусты
+        near = np.all((position[active] > -1) & (position[active] < self._shape + 1), axis=1)
+        far, active = active[~near], active[near]
+        cells = np.floor(position[active]).astype(np.int64)
+        fraction = position[active] - cells
+
+        for offsets in (np.zeros((1, 3), dtype=np.int64), self._NEIGHBOURS):
+            step = max(1, self._batch_size // len(offsets))
+            for start in range(0, len(active), step):
+                batch = slice(start, start + step)
+                self._search_cells(points, best_dist, best_index, active[batch], cells[batch], fraction[batch],
+                                   offsets, scale, stats)
+        # Расстояние от запроса до вокселей за пределами просмотренного куба 3x3x3
+        bound = self._cell_size * np.min(np.minimum(fraction + 1, 2 - fraction), axis=1)
+        active = active[np.square(bound) * scale < best_dist[active, -1]]
+
+        rest = np.sort(np.concatenate((far, active)))
+        if len(rest):
+            self._search_tree(points[rest], best_dist, best_index, rest, max_distance, stats, eps)
+
+    def _search_tree(self, points: np.ndarray, best_dist: np.ndarray, best_index: np.ndarray, queries: np.ndarray,
+                     max_distance: float, stats: Optional[dict], eps: float):
+        """
+        Поиск в KDTree для запросов, не решенных по 27 вокселям.
+        При k == 1 найденный в вокселях сосед передается в дерево как начальный кандидат,
+        при k > 1 списки соседей заполняются заново.
+
+        Args:
+            points (np.ndarray): точки этих запросов.
+            best_dist (np.ndarray): квадраты расстояний до текущих соседей, обновляется.
+            best_index (np.ndarray): индексы текущих соседей, обновляется.
+            queries (np.ndarray): индексы запросов.
+            max_distance (float): радиус поиска.
+            stats (Optional[dict]): счетчики поиска.
+            eps (float): допустимая относительная ошибка.
+        """
+        if self._tree is None:
+            self._tree = KDTree(PointCloud)
+            self._tree.build(PointCloud(self._points))
+        k = best_dist.shape[1]
+        hint = best_index[queries, 0] if k == 1 else None
+        tree_stats = None if stats is None else dict.fromkeys(KDTree.STATS_KEYS, 0)
+        dist, indices = self._tree.query(points, k, max_distance, hint, tree_stats, eps)
+        best_dist[queries] = np.square(dist).reshape(len(queries), k)
+        best_index[queries] = indices.reshape(len(queries), k)
+        if stats is not None:
+            stats['tree_queries'] += len(queries)
+            stats['distance_evaluations'] += tree_stats['leaf_distance_evaluations']
+
+    def _search_cells(self, points: np.ndarray, best_dist: np.ndarray, best_index: np.ndarray, queries: np.ndarray,
+                      cells: np.ndarray, fraction: np.ndarray, offsets: np.ndarray, scale: float,
+                      stats: Optional[dict]):
+        """
+        Проверить точки вокселей со смещениями offsets относительно вокселей запросов.
+        Воксели, расстояние до которых, умноженное на (1 + eps), не меньше расстояния до текущего k-го соседа,
+        пропускаются.
+
+        Args:
+            points (np.ndarray): точки-запросы.
+            best_dist (np.ndarray): квадраты расстояний до текущих соседей, обновляется.
+            best_index (np.ndarray): индексы текущих соседей, обновляется.
+            queries (np.ndarray): индексы проверяемых запросов по возрастанию.
+            cells (np.ndarray): воксели этих запросов размера (len(queries), 3).
+            fraction (np.ndarray): положение запросов внутри их вокселей в долях ребра, размер (len(queries), 3).
+            offsets (np.ndarray): смещения вокселей размера (C, 3).
+            scale (float): множитель (1 + eps)^2 для квадратов расстояний до вокселей.
+            stats (Optional[dict]): счетчики поиска.
+        """
+        # Квадрат расстояния до соседнего вокселя по каждой оси для смещений -1, 0, 1: до нижней грани,
+        # 0 или до верхней грани, inf если воксель вне сетки
+        gaps = np.square(np.stack((fraction, np.zeros_like(fraction), 1 - fraction), axis=2) * self._cell_size)
+        for shift in (-1, 0, 1):
+            gaps[:, :, shift + 1][(cells + shift < 0) | (cells + shift >= self._shape)] = np.inf
+        cell_dist = sum(gaps[:, axis, offsets[:, axis] + 1] for axis in range(3))
+        inside = cell_dist * scale < best_dist[queries, -1][:, None]
+        query_id = np.broadcast_to(queries[:, None], inside.shape)[inside]
+        # Ключ линеен по координатам вокселя, поэтому ключ соседа - сумма ключа вокселя и ключа смещения
+        keys = (self._ravel(cells, self._shape)[:, None] + self._ravel(offsets, self._shape)[None, :])[inside]
+        found = np.minimum(np.searchsorted(self._keys, keys), len(self._keys) - 1)
+        occupied = self._keys[found] == keys
+        query_id, found = query_id[occupied], found[occupied]
+        if stats is not None:
+            stats['cells_visited'] += np.count_nonzero(inside)
+
+        # Пары запрос-воксель делятся на части не больше batch_size пар запрос-точка
+        counts = self._end[found] - self._start[found]
+        total = np.cumsum(counts)
+        bounds = np.searchsorted(total, np.arange(self._batch_size, total[-1] if len(total) else 0,
+                                                  self._batch_size), side='right')
+        for part in np.split(np.arange(len(found)), bounds):
+            if not len(part):
+                continue
+            part_counts = counts[part]
+            first = np.cumsum(part_counts) - part_counts
+            positions = np.repeat(self._start[found[part]] - first, part_counts) + np.arange(part_counts.sum())
+            self._merge(points, best_dist, best_index, np.repeat(query_id[part], part_counts), positions, stats)
+
+    def _merge(self, points: np.ndarray, best_dist: np.ndarray, best_index: np.ndarray, query_id: np.ndarray,
+               positions: np.ndarray, stats: Optional[dict]):
+        """
+        Обновить списки k ближайших соседей парами запрос-точка.
+
+        Args:
+            points (np.ndarray): точки-запросы.
+            best_dist (np.ndarray): отсортированные квадраты расстояний до текущих соседей (M, k), обновляется.
+            best_index (np.ndarray): индексы текущих соседей (M, k), обновляется.
+            query_id (np.ndarray): неубывающие индексы запросов в парах.
+            positions (np.ndarray): позиции точек пар в _sorted_points.
+            stats (Optional[dict]): счетчики поиска.
+        """
+        if not len(positions):
+            return
+        if stats is not None:
+            stats['distance_evaluations'] += len(positions)
+        difference = np.take(self._sorted_points, positions, axis=0) - np.take(points, query_id, axis=0)
+        dist = np.einsum('ij,ij->i', difference, difference)
+
+        k = best_dist.shape[1]
+        if k == 1:
+            closest = best_dist[:, 0].copy()
+            np.minimum.at(closest, query_id, dist)
+            hit = np.flatnonzero((dist == closest[query_id]) & (dist < best_dist[query_id, 0]))
+            best_dist[:, 0] = closest
+            best_index[query_id[hit], 0] = self._order[positions[hit]]
+            return
+
+        first = np.flatnonzero(np.diff(query_id, prepend=-1))
+        queries = query_id[first]
+        order = np.lexsort((dist, query_id))
+        dist, positions = dist[order], positions[order]
+        sizes = np.diff(np.append(first, len(dist)))
+        rank = np.arange(len(dist)) - np.repeat(first, sizes)
+        keep = rank < k
+        row = np.repeat(np.arange(len(first)), sizes)[keep]
+        new_dist = np.full((len(queries), k), np.inf)
+        new_index = np.full((len(queries), k), len(self._points), dtype=np.int64)
+        new_dist[row, rank[keep]] = dist[keep]
+        new_index[row, rank[keep]] = self._order[positions[keep]]
+        self._push_candidates(best_dist, best_index, queries, new_dist, new_index)
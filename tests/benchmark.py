@@ -0,0 +1,282 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'src'))
+
+from ICP import ICP
+from IncrementalKDTree import IncrementalKDTree
+from KDTree import KDTree
+from PlyReader import PlyReader
+from Point3D import Point3D
+from PointCloud import PointCloud
+from VoxelGrid import VoxelGrid
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+SCANS = ('bun000_small.ply', 'bun045_small.ply', 'bun000.ply', 'bun045.ply')
+
+
+def measure(name: str, params: dict, function: Callable[[], None], setup: Optional[Callable[[], None]] = None,
+            repeat: int = 3) -> dict:
+    """
+    Замерить время и пиковую память запуска.
+    Время - лучшее из repeat запусков без трассировки памяти, память - пик tracemalloc в отдельном запуске.
+
+    Args:
+        name (str): имя замера.
+        params (dict): параметры замера.
+        function (Callable[[], None]): замеряемая функция.
+        setup (Optional[Callable[[], None]]): подготовка перед каждым запуском, не входит в замер.
+        repeat (int): число запусков для замера времени.
+
+    Returns:
+        dict: запись с результатами замера.
+    """
+    times = []
+    for _ in range(repeat):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        function()
+        times.append(time.perf_counter() - start)
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    record = {'name': name, 'params': params, 'seconds': min(times), 'seconds_all': times, 'peak_memory_bytes': peak}
+    print(f"{name} {params}: {min(times):.4f} s, peak {peak / 2 ** 20:.1f} MiB", file=sys.stderr)
+    return record
+
+
+def synthetic_cloud(size: int, seed: int = 0) -> np.ndarray:
+    """
+    Синтетическое облако: точки на поверхности единичной сферы с шумом.
+
+    Args:
+        size (int): число точек.
+        seed (int): зерно генератора случайных чисел.
+
+    Returns:
+        np.ndarray: массив точек размера (size, 3).
+    """
+    rng = np.random.default_rng(seed)
+    points = rng.normal(size=(size, 3))
+    points /= np.linalg.norm(points, axis=1, keepdims=True)
+    return points + rng.normal(scale=0.01, size=points.shape)
+
+
+def rotation(angle: float) -> np.ndarray:
+    """
+    Матрица поворота вокруг оси z.
+
+    Args:
+        angle (float): угол в радианах.
+
+    Returns:
+        np.ndarray: матрица 3x3.
+    """
+    return np.array([[np.cos(angle), -np.sin(angle), 0], [np.sin(angle), np.cos(angle), 0], [0, 0, 1]])
+
+
+def bench_ply(repeat: int) -> List[dict]:
+    return [measure('ply_load', {'file': scan}, lambda scan=scan: PlyReader(os.path.join(DATA_DIR, scan)).read(),
+                    repeat=repeat) for scan in SCANS]
+
+
+def bench_cloud(clouds: Dict[str, np.ndarray], repeat: int) -> List[dict]:
+    records = []
+    for label, points in clouds.items():
+        cloud = PointCloud(points.copy())
+        params = {'cloud': label, 'points': len(points)}
+        records.append(measure('cloud_rotate', params, lambda: cloud.rotate(rotation(0.1)), repeat=repeat))
+        records.append(measure('cloud_translate', params, lambda: cloud.translate(np.array([1e-3, 0, 0])),
+                               repeat=repeat))
+        records.append(measure('cloud_mass_center', params, lambda: cloud.mass_center, repeat=repeat))
+        records.append(measure('cloud_voxel_downsample', params, lambda: cloud.voxel_downsample(0.01),
+                               repeat=repeat))
+        records.append(measure('cloud_create', {**params, 'dtype': 'float32'},
+                               lambda: PointCloud(points, np.float32), repeat=repeat))
+        rows = points.tolist()
+        records.append(measure('point3d_create', params, lambda: [Point3D(*row) for row in rows], repeat=repeat))
+    return records
+
+
+def bench_kdtree(clouds: Dict[str, np.ndarray], repeat: int, queries: int) -> List[dict]:
+    records = []
+    for label, points in clouds.items():
+        cloud = PointCloud(points)
+        params = {'cloud': label, 'points': len(points)}
+        records.append(measure('kdtree_build', params, lambda: KDTree(PointCloud).build(cloud), repeat=repeat))
+
+        tree = KDTree(PointCloud)
+        tree.build(cloud)
+        rng = np.random.default_rng(1)
+        query = points[rng.integers(len(points), size=queries)] + rng.normal(scale=1e-3, size=(queries, 3))
+        single = [Point3D(*q) for q in query[:max(1, queries // 10)]]
+        records.append(measure('kdtree_find_closest', {**params, 'queries': len(single)},
+                               lambda: [tree.find_closest(p) for p in single], repeat=repeat))
+        records.append(measure('kdtree_query', {**params, 'queries': queries}, lambda: tree.query(query),
+                               repeat=repeat))
+        # Хранение в float32: пик памяти построения и запросы с расстояниями в float64
+        compact = PointCloud(points, np.float32)
+        records.append(measure('kdtree_build', {**params, 'dtype': 'float32'},
+                               lambda: KDTree(PointCloud).build(compact), repeat=repeat))
+        compact_tree = KDTree(PointCloud)
+        compact_tree.build(compact)
+        records.append(measure('kdtree_query', {**params, 'queries': queries, 'dtype': 'float32'},
+                               lambda: compact_tree.query(query), repeat=repeat))
+        for options in ({'eps': 1.0}, {'max_leaves': 1}):
+            records.append(measure('kdtree_query_approximate', {**params, 'queries': queries, **options},
+                                   lambda options=options: tree.query(query, **options), repeat=repeat))
+    return records
+
+
+def bench_index(clouds: Dict[str, np.ndarray], repeat: int, queries: int) -> List[dict]:
+    records = []
+    for label, points in clouds.items():
+        cloud = PointCloud(points)
+        params = {'cloud': label, 'points': len(points)}
+        records.append(measure('voxel_grid_build', params, lambda: VoxelGrid().build(points), repeat=repeat))
+
+        tree = KDTree(PointCloud)
+        tree.build(cloud)
+        grid = VoxelGrid()
+        grid.build(points)
+        # Ограниченный поиск: радиус в два ребра подобранного вокселя, сетка с вокселем в радиус
+        radius = 2 * grid.cell_size
+        bounded = VoxelGrid(radius)
+        bounded.build(points)
+        rng = np.random.default_rng(1)
+        query = points[rng.integers(len(points), size=queries)] + rng.normal(scale=radius / 4, size=(queries, 3))
+        params = {**params, 'queries': queries, 'cell_size': grid.cell_size}
+        records.append(measure('voxel_grid_query', params, lambda: grid.query(query), repeat=repeat))
+        params = {**params, 'max_distance': radius}
+        records.append(measure('kdtree_query_bounded', params, lambda: tree.query(query, max_distance=radius),
+                               repeat=repeat))
+        records.append(measure('voxel_grid_query_bounded', params,
+                               lambda: bounded.query(query, max_distance=radius), repeat=repeat))
+
+        # Потоковое пополнение карты кадрами: вставка в лес деревьев против перестроения KDTree после кадра
+        frames = np.array_split(points, 10)
+        params = {'cloud': label, 'points': len(points), 'frames': len(frames)}
+        records.append(measure('incremental_kdtree_insert', params, lambda: stream(IncrementalKDTree(), frames),
+                               repeat=repeat))
+        records.append(measure('kdtree_rebuild_per_frame', params,
+                               lambda: [KDTree(PointCloud).build(PointCloud(np.concatenate(frames[:i + 1])))
+                                        for i in range(len(frames))], repeat=repeat))
+    return records
+
+
+def stream(index: IncrementalKDTree, frames: List[np.ndarray]) -> IncrementalKDTree:
+    """
+    Вставить кадры в индекс по одному.
+
+    Args:
+        index (IncrementalKDTree): индекс.
+        frames (List[np.ndarray]): кадры, массивы размера (M, 3).
+
+    Returns:
+        IncrementalKDTree: пополненный индекс.
+    """
+    for frame in frames:
+        index.insert(frame)
+    return index
+
+
+def bench_icp(pairs: Dict[str, tuple], repeat: int, max_iter: int) -> List[dict]:
+    records = []
+    for label, (source, target) in pairs.items():
+        params = {'pair': label, 'source_points': len(source), 'target_points': len(target), 'max_iter': max_iter}
+        records.append(measure('icp_algorithm', params,
+                               lambda: ICP(PointCloud(source), PointCloud(target), max_iter=max_iter).icp_algorithm(),
+                               repeat=repeat))
+        records.append(measure('icp_algorithm', {**params, 'dtype': 'float32'},
+                               lambda: ICP(PointCloud(source, np.float32), PointCloud(target, np.float32),
+                                           max_iter=max_iter).icp_algorithm(), repeat=repeat))
+        records.append(measure('icp_algorithm_voxel_grid', params,
+                               lambda: ICP(PointCloud(source), PointCloud(target), max_iter=max_iter,
+                                           spatial_index=voxel_grid(target)).icp_algorithm(),
+                               repeat=repeat))
+    return records
+
+
+def voxel_grid(points: np.ndarray) -> VoxelGrid:
+    """
+    Воксельная сетка с подобранным размером вокселя.
+
+    Args:
+        points (np.ndarray): массив точек размера (N, 3).
+
+    Returns:
+        VoxelGrid: построенная сетка.
+    """
+    index = VoxelGrid()
+    index.build(points)
+    return index
+
+
+def main(argv: Optional[List[str]] = None) -> dict:
+    parser = argparse.ArgumentParser(
+        description="Benchmarks for KDTree, VoxelGrid, IncrementalKDTree, PointCloud, PLY loading and ICP.")
+    parser.add_argument('--output', help="JSON output path, stdout if omitted")
+    parser.add_argument('--repeat', type=int, default=3, help="timed runs per benchmark, the best is reported")
+    parser.add_argument('--sizes', type=int, nargs='*', default=[10000, 100000], help="synthetic cloud sizes")
+    parser.add_argument('--queries', type=int, default=10000, help="batch query size")
+    parser.add_argument('--max-iter', type=int, default=20, help="ICP iterations")
+    parser.add_argument('--only', nargs='*', default=['ply', 'cloud', 'kdtree', 'index', 'icp'],
+                        help="benchmark groups to run: ply, cloud, kdtree, index, icp")
+    args = parser.parse_args(argv)
+
+    scans = {scan: PlyReader(os.path.join(DATA_DIR, scan)).read() for scan in SCANS}
+    clouds = {scan: scans[scan] for scan in ('bun000_small.ply', 'bun000.ply')}
+    clouds.update({f'synthetic_{size}': synthetic_cloud(size) for size in args.sizes})
+    pairs = {
+        'bun000_small->bun045_small': (scans['bun000_small.ply'], scans['bun045_small.ply']),
+        'bun000->bun045': (scans['bun000.ply'], scans['bun045.ply']),
+    }
+    for size in args.sizes:
+        target = synthetic_cloud(size)
+        pairs[f'synthetic_{size}'] = (target @ rotation(0.05).T + [0.01, 0, 0], target)
+
+    records = []
+    if 'ply' in args.only:
+        records += bench_ply(args.repeat)
+    if 'cloud' in args.only:
+        records += bench_cloud(clouds, args.repeat)
+    if 'kdtree' in args.only:
+        records += bench_kdtree(clouds, args.repeat, args.queries)
+    if 'index' in args.only:
+        records += bench_index(clouds, args.repeat, args.queries)
+    if 'icp' in args.only:
+        records += bench_icp(pairs, args.repeat, args.max_iter)
+
+    report = {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'benchmarks': records,
+    }
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(report, file, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    return report
+
+
+if __name__ == '__main__':
+    main()
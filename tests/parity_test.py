@@ -0,0 +1,115 @@
+import numpy as np
+
+from IncrementalKDTree import IncrementalKDTree
+from KDTree import KDTree
+from ParallelSearch import ParallelSearch
+from Point3D import Point3D
+from PointCloud import PointCloud
+from SpatialIndex import SpatialIndex
+from VoxelGrid import VoxelGrid
+
+TARGET_SIZE = 2000
+QUERY_SIZE = 300
+MAX_DISTANCE = 0.05
+
+
+def make_points(seed: int = 0):
+    """
+    Детерминированные точки target и запросы, часть запросов лежит вне облака.
+
+    Args:
+        seed (int): зерно генератора.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray] - (точки target, точки-запросы).
+    """
+    rng = np.random.default_rng(seed)
+    target = rng.random((TARGET_SIZE, 3))
+    queries = rng.random((QUERY_SIZE, 3)) * 1.2 - 0.1
+    return target, queries
+
+
+def brute_force(target: np.ndarray, queries: np.ndarray, k: int, max_distance: float) -> np.ndarray:
+    """
+    Расстояния до k ближайших соседей полным перебором.
+
+    Args:
+        target (np.ndarray): точки target.
+        queries (np.ndarray): точки-запросы.
+        k (int): число соседей.
+        max_distance (float): радиус поиска.
+
+    Returns:
+        np.ndarray: расстояния размера (M, k), соседи дальше радиуса - inf.
+    """
+    dist = np.sort(np.linalg.norm(queries[:, None, :] - target[None, :, :], axis=2), axis=1)[:, :k]
+    dist[dist >= max_distance] = np.inf
+    return dist
+
+
+def check_query(index: SpatialIndex | ParallelSearch, target: np.ndarray, queries: np.ndarray):
+    """
+    Сравнить query с полным перебором при k = 1 и k = 4, с max_distance и без, с hint и без.
+
+    Args:
+        index (SpatialIndex | ParallelSearch): структура, построенная по target в исходном порядке.
+        target (np.ndarray): точки target.
+        queries (np.ndarray): точки-запросы.
+    """
+    rng = np.random.default_rng(1)
+    for k in (1, 4):
+        for max_distance in (np.inf, MAX_DISTANCE):
+            hints = [None]
+            if k == 1:
+                hints.append(rng.integers(-10, len(target) + 10, len(queries)))
+            for hint in hints:
+                dist, indices = index.query(queries, k, max_distance, hint)
+                dist, indices = dist.reshape(len(queries), k), indices.reshape(len(queries), k)
+                assert np.allclose(dist, brute_force(target, queries, k, max_distance))
+
+                found = np.isfinite(dist)
+                rows = np.nonzero(found)[0]
+                assert np.allclose(np.linalg.norm(queries[rows] - target[indices[found]], axis=1), dist[found])
+                assert np.all(indices[~found] == len(target))
+
+
+def test_kd_tree():
+    target, queries = make_points()
+    tree = KDTree(PointCloud, leaf_size=8)
+    tree.build(PointCloud(target))
+    check_query(tree, target, queries)
+
+    expected = brute_force(target, queries, 1, np.inf)[:, 0]
+    for query, dist in zip(queries[:50], expected):
+        closest_dist, closest = tree.find_closest(Point3D(*query))
+        assert np.isclose(closest_dist, dist)
+        assert np.isclose(np.linalg.norm(np.array(list(closest)) - query), dist)
+
+
+def test_voxel_grid():
+    target, queries = make_points()
+    grid = VoxelGrid()
+    grid.build(PointCloud(target))
+    check_query(grid, target, queries)
+
+
+def test_incremental_kd_tree():
+    target, queries = make_points()
+    tree = IncrementalKDTree(leaf_size=8)
+    for batch in np.array_split(target, [700, 1500, 1900]):
+        tree.insert(batch)
+    check_query(tree, target, queries)
+
+
+def test_parallel_search():
+    target, queries = make_points()
+    tree = KDTree(PointCloud, leaf_size=8)
+    tree.build(PointCloud(target))
+    with ParallelSearch(tree, 2) as search:
+        check_query(search, target, queries)
+
+
+if __name__ == '__main__':
+    for test in (test_kd_tree, test_voxel_grid, test_incremental_kd_tree, test_parallel_search):
+        test()
+        print(test.__name__, 'ok')
@@ -1,10 +1,9 @@
-import numpy as np
 from matplotlib import pyplot as plt
-from plyfile import PlyData
 
 from ICP import ICP
-from Point3D import Point3D
+from PlyReader import PlyReader
 from PointCloud import PointCloud
+from RegistrationViewer import RegistrationViewer
 
 
 def read_ply_file(file_path: str) -> PointCloud:
@@ -17,23 +16,13 @@ def read_ply_file(file_path: str) -> PointCloud:
     Returns:
         PointCloud: облако точек.
     """
-    plydata = PlyData.read(file_path)
-
-    vertices = plydata['vertex']
-    x = vertices['x']
-    y = vertices['y']
-    z = vertices['z']
-
-    points = np.vstack((x, y, z)).T
-    points = PointCloud([Point3D(p[0], p[1], p[2]) for p in points.tolist()])
-    return points
+    return PlyReader(file_path).read_cloud()
 
 
 if __name__ == '__main__':
-    source = read_ply_file('data/bun000_small.ply')
-    target = read_ply_file('data/bun045_small.ply')
+    source = read_ply_file('data/bun000.ply').voxel_downsample(0.01)
+    target = read_ply_file('data/bun045.ply').voxel_downsample(0.01)
 
-    fig = plt.figure(figsize=(15, 15))
-    ax = plt.axes(projection='3d')
-    ICP(source, target).icp_algorithm(debug=True, ax=ax)
+    viewer = RegistrationViewer(source, target)
+    print(viewer.run(ICP(source, target), debug=True))
     plt.show()